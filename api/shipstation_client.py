@@ -1,7 +1,11 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
 
 load_dotenv()  # Load credentials from .env file
 
@@ -10,30 +14,45 @@ API_KEY = os.getenv("SHIPSTATION_V1_KEY")
 API_SECRET = os.getenv("SHIPSTATION_V1_SECRET")
 BASE_URL = "https://ssapi.shipstation.com"
 
+# Shared keep-alive session so every call reuses one pooled TLS connection
+SESSION = requests.Session()
+SESSION.auth = HTTPBasicAuth(API_KEY, API_SECRET)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=50,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+    ),
+))
+
+PAGE_FETCH_WORKERS = 5
+
 def get_orders(store_id, order_status="awaiting_shipment", page_size=500):
     """Fetches all orders for a given store with optional status"""
-    all_orders = []
-    current_page = 1
 
-    while True:
+    def fetch_page(page):
         url = f"{BASE_URL}/orders"
         params = {
             "storeId": store_id,
             "orderStatus": order_status,
             "pageSize": page_size,
-            "page": current_page
+            "page": page
         }
-
-        response = requests.get(url, auth=HTTPBasicAuth(API_KEY, API_SECRET), params=params)
-
+        response = SESSION.get(url, params=params)
         if response.status_code != 200:
             raise Exception(f"Error fetching orders: {response.status_code} - {response.text}")
-
-        data = response.json()
-        all_orders.extend(data.get("orders", []))
-
-        if current_page >= data.get("pages", 1):
-            break
-        current_page += 1
+        return response.json()
+
+    # First page tells us how many pages there are; fetch the rest in parallel
+    data = fetch_page(1)
+    all_orders = data.get("orders", [])
+    pages = data.get("pages", 1)
+    if pages > 1:
+        with ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS) as pool:
+            for extra in pool.map(fetch_page, range(2, pages + 1)):
+                all_orders.extend(extra.get("orders", []))
 
     return all_orders
@@ -1,10 +1,20 @@
 import os
-import json
+import bisect
+import logging
+import re
+import sqlite3
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from types import SimpleNamespace
 
+import orjson
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 """
 ShipStation Order Processor (Python rewrite)
@@ -29,6 +39,11 @@ Notes:
 BASE_DIR = Path(__file__).resolve().parent
 load_dotenv(BASE_DIR / ".env")
 
+# Buffered, leveled logging instead of per-call print — set LOG_LEVEL=WARNING
+# to silence the per-order chatter on big batches.
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(message)s")
+log = logging.getLogger(__name__)
+
 API_KEY = os.getenv("SHIPSTATION_V1_KEY")
 API_SECRET = os.getenv("SHIPSTATION_V1_SECRET")
 if not API_KEY or not API_SECRET:
@@ -37,6 +52,56 @@ if not API_KEY or not API_SECRET:
 BASE_URL = "https://ssapi.shipstation.com"
 HEADERS = {"Content-Type": "application/json"}
 
+# One pooled keep-alive session for every ShipStation call — avoids a fresh
+# TCP+TLS handshake per request and retries transient failures with backoff.
+SESSION = requests.Session()
+SESSION.auth = (API_KEY, API_SECRET)
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=50,
+    # Connection-level retries only; 429/5xx handling lives in api_call so we
+    # can honor Retry-After globally instead of per-connection.
+    max_retries=Retry(total=3, backoff_factor=0.5),
+))
+
+# ---------------------------------------------------------------------------
+# Global rate limiting — ShipStation allows 200 requests/minute per account
+# ---------------------------------------------------------------------------
+RATE_LIMIT_PER_MINUTE = 200
+_rate_lock = threading.Lock()
+_call_times: deque = deque()
+
+def _acquire_rate_slot() -> None:
+    while True:
+        with _rate_lock:
+            now = time.monotonic()
+            while _call_times and now - _call_times[0] >= 60.0:
+                _call_times.popleft()
+            if len(_call_times) < RATE_LIMIT_PER_MINUTE:
+                _call_times.append(now)
+                return
+            wait = 60.0 - (now - _call_times[0])
+        time.sleep(wait)
+
+def api_call(method: str, url: str, max_attempts: int = 5, **kwargs):
+    """Single choke point for ShipStation traffic: token-bucket below the
+    200 req/min cap, sleep out 429s per Retry-After, back off on 5xx."""
+    resp = None
+    for attempt in range(max_attempts):
+        _acquire_rate_slot()
+        resp = SESSION.request(method, url, **kwargs)
+        if resp.status_code == 429:
+            retry_after = int(resp.headers.get("Retry-After", "1"))
+            log.warning(f"⏳ 429 from {url} — sleeping {retry_after}s (Retry-After)")
+            time.sleep(retry_after)
+            continue
+        if resp.status_code >= 500:
+            time.sleep(0.5 * (2 ** attempt))
+            continue
+        return resp
+    return resp
+
 # ---------------------------------------------------------------------------
 # Tag constants & names
 # ---------------------------------------------------------------------------
@@ -72,13 +137,36 @@ def tag_name(tag_id: int) -> str:
 def assign_tag(order_id: int, tag_id: int) -> None:
     url = f"{BASE_URL}/orders/addtag"
     data = {"orderId": int(order_id), "tagId": int(tag_id)}
-    resp = requests.post(url, headers=HEADERS, auth=(API_KEY, API_SECRET), json=data)
-    print(f"POST {url} with {data}")
-    print(f"Response: {resp.status_code} - {resp.text}")
+    resp = api_call("POST", url, data=orjson.dumps(data))
+    log.debug(f"POST {url} with {data}")
+    log.debug(f"Response: {resp.status_code} - {resp.text}")
     if resp.status_code == 200:
-        print(f"🏷 Tag {tag_id} applied to order {order_id}")
+        log.info(f"🏷 Tag {tag_id} applied to order {order_id}")
     else:
-        print(f"❌ Failed to tag order {order_id}: {resp.status_code} - {resp.text}")
+        log.error(f"❌ Failed to tag order {order_id}: {resp.status_code} - {resp.text}")
+
+# Bulk tagging — accumulate (tag → orderIds) during the run and flush each
+# group with one batched POST instead of one round-trip per (order, tag) pair.
+TAG_QUEUE: dict = {}
+BULK_TAG_CHUNK = 100
+
+def queue_tag(order_id: int, tag_id: int) -> None:
+    TAG_QUEUE.setdefault(int(tag_id), []).append(int(order_id))
+
+def flush_tag_queue() -> None:
+    # addtagtobatch takes {"orderIds": [...], "tagId": ...}; plain addtag
+    # is single-order only
+    url = f"{BASE_URL}/orders/addtagtobatch"
+    for tag_id, order_ids in TAG_QUEUE.items():
+        for i in range(0, len(order_ids), BULK_TAG_CHUNK):
+            chunk = order_ids[i:i + BULK_TAG_CHUNK]
+            data = {"orderIds": chunk, "tagId": tag_id}
+            resp = api_call("POST", url, data=orjson.dumps(data))
+            if resp.status_code == 200:
+                log.info(f"🏷 Tag {tag_id} applied to {len(chunk)} orders in one call")
+            else:
+                log.error(f"❌ Bulk tag {tag_id} failed for {len(chunk)} orders: {resp.status_code} - {resp.text}")
+    TAG_QUEUE.clear()
 
 # Weight / box rules
 SKU_WEIGHT_MAP = {
@@ -95,38 +183,87 @@ BOX_SIZES = [
     {"length": 16, "width": 12, "height": 10, "max_items": 8},
     {"length": 20, "width": 14, "height": 12, "max_items": 16},
 ]
+# BOX_SIZES is sorted by capacity, so box selection is a bisect over the
+# max_items cutoffs instead of a per-order scan of the dicts above.
+_CUTOFFS = [b["max_items"] for b in BOX_SIZES]
+_BOX_TUPLES = [(b["length"], b["width"], b["height"]) for b in BOX_SIZES]
 
 def assign_weight_and_dimensions(order: dict) -> None:
     items = order.get("items", [])
     total_weight = 0.0
     total_items = 0
     large_item_present = False
+    weight_for = SKU_WEIGHT_MAP.get  # resolve once for the inner loop
 
     for it in items:
         sku = (it.get("sku") or "").upper()
         qty = int(it.get("quantity") or 1)
         total_items += qty
-        total_weight += SKU_WEIGHT_MAP.get(sku, DEFAULT_WEIGHT_OZ) * qty
+        total_weight += weight_for(sku, DEFAULT_WEIGHT_OZ) * qty
         if sku.startswith("8IN") or sku == "BUNDLE":
             large_item_present = True
 
     if large_item_present:
-        chosen_box = BOX_SIZES[-2]
+        length, width, height = _BOX_TUPLES[-2]
     else:
-        chosen_box = BOX_SIZES[-1]
-        for b in BOX_SIZES:
-            if total_items <= b["max_items"]:
-                chosen_box = b
-                break
+        idx = bisect.bisect_left(_CUTOFFS, total_items)
+        length, width, height = _BOX_TUPLES[min(idx, len(_BOX_TUPLES) - 1)]
 
     order["weight"] = {"value": total_weight, "units": "ounces"}
     order["dimensions"] = {
-        "length": chosen_box["length"],
-        "width": chosen_box["width"],
-        "height": chosen_box["height"],
+        "length": length,
+        "width": width,
+        "height": height,
         "units": "inches",
     }
-    print(f"Assigned weight {total_weight} oz and box ({chosen_box['length']}x{chosen_box['width']}x{chosen_box['height']}) to order {order.get('orderNumber')}")
+    log.info(f"Assigned weight {total_weight} oz and box ({length}x{width}x{height}) to order {order.get('orderNumber')}")
+
+# Rate-preference keyword sets, compiled once into a single alternation regex
+# per category — one C-level scan per rate instead of a nested keyword loop.
+def _keywords_re(*keywords):
+    return re.compile("|".join(map(re.escape, keywords)))
+
+EXPEDITED_RE = _keywords_re(
+    "2day", "2-day", "two day", "express", "expedited",
+    "priority_overnight", "ups_2nd_day", "ups second", "fedex_2day", "fedex 2 day",
+)
+DOMESTIC_LIGHT_RE = _keywords_re(
+    "first_class", "usps_first", "stamps_first_class", "ground_advantage", "ground advantage",
+)
+DOMESTIC_RE = _keywords_re(
+    "usps_priority", "priority_mail", "priority mail",
+    "ups_ground", "surepost",
+    "fedex_ground", "home_delivery",
+)
+INTERNATIONAL_RE = _keywords_re(
+    "ups_worldwide", "worldwide saver", "worldwide expedited",
+    "priority_mail_international", "usps_priority_mail_international",
+    "fedex_international", "international economy", "international priority",
+)
+
+# Final (carrierCode, serviceCode) selections memoized by the decision inputs
+# — destination country + ZIP3, rounded weight, box, expedited flag. Repeat
+# shipment shapes skip the rate-shop network calls entirely.
+SELECTION_CACHE: dict = {}
+
+# Per-run memo of /shipments/getrates responses. Many orders in a batch share
+# the same destination ZIP, weight and box, so repeat shapes skip the network.
+_RATE_CACHE: dict = {}
+
+
+def _rate_cache_key(carrier: str, shipment: dict) -> str:
+    dims = shipment.get("dimensions") or {}
+    weight = shipment.get("weight") or {}
+    return "|".join(str(p) for p in (
+        carrier,
+        shipment.get("fromPostalCode"),
+        shipment.get("toPostalCode"),
+        shipment.get("toCountry"),
+        weight.get("value"),
+        f"{dims.get('length')}x{dims.get('width')}x{dims.get('height')}",
+        shipment.get("residential"),
+    ))
+
 
 # Ruby-style rate shopping
 def set_shipping_service(order: dict) -> None:
@@ -144,16 +281,15 @@ def set_shipping_service(order: dict) -> None:
         except Exception:
             return False
 
-    def _choose_by_keywords(rates_list, keywords):
+    def _choose_by_pattern(rates_list, pattern):
         if not rates_list:
             return None
-        cands = []
-        for r in rates_list:
-            sc = (r.get("serviceCode") or "").lower()
-            sn = (r.get("serviceName") or "").lower()
-            cc = (r.get("carrierCode") or "").lower()
-            if any(k in sc or k in sn or k in cc for k in keywords):
-                cands.append(r)
+        cands = [
+            r for r in rates_list
+            if pattern.search(
+                f"{r.get('serviceCode') or ''}|{r.get('serviceName') or ''}|{r.get('carrierCode') or ''}".lower()
+            )
+        ]
         return min(cands, key=lambda rr: rr.get("shipmentCost", float("inf"))) if cands else None
 
     # Build base shipment; we add carrierCode per request.
@@ -169,69 +305,85 @@ def set_shipping_service(order: dict) -> None:
     }
     base_shipment = {k: v for k, v in base_shipment.items() if v is not None}
 
+    to_country = (base_shipment.get("toCountry") or "US").upper()
+    is_domestic = to_country in {"US", "USA"}
+    try:
+        weight_oz = float((base_shipment.get("weight") or {}).get("value") or 0.0)
+    except Exception:
+        weight_oz = 0.0
+
+    expedited = _order_has_tag(order, 126500)  # expedited batch tag
+
+    dims = base_shipment.get("dimensions") or {}
+    sel_key = (
+        to_country,
+        (base_shipment.get("toPostalCode") or "")[:3],
+        round(weight_oz),
+        (dims.get("length"), dims.get("width"), dims.get("height")),
+        expedited,
+    )
+    cached_sel = SELECTION_CACHE.get(sel_key)
+    if cached_sel is not None:
+        order["carrierCode"], order["serviceCode"] = cached_sel
+        log.info(f"Selected {order['carrierCode']} {order['serviceCode']} for {order.get('orderNumber')} (cached selection)")
+        return
+
     carriers = ["stamps_com", "ups", "fedex"]
     all_rates = []
     url = f"{BASE_URL}/shipments/getrates"
 
-    for carrier in carriers:
+    def _fetch_carrier_rates(carrier):
+        cache_key = _rate_cache_key(carrier, base_shipment)
+        cached = _RATE_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
         payload = dict(base_shipment)
         payload["carrierCode"] = carrier
-        resp = requests.post(url, headers=HEADERS, auth=(API_KEY, API_SECRET), json=payload)
+        resp = api_call("POST", url, data=orjson.dumps(payload))
         if resp.status_code == 200:
-            rates = resp.json() or []
-            if isinstance(rates, list):
-                all_rates.extend(rates)
-        else:
-            print(f"⚠️ Rates error for {carrier} on {order.get('orderNumber')}: {resp.status_code} {resp.text}")
+            rates = orjson.loads(resp.content) or []
+            if not isinstance(rates, list):
+                rates = []
+            _RATE_CACHE[cache_key] = rates
+            return rates
+        log.warning(f"⚠️ Rates error for {carrier} on {order.get('orderNumber')}: {resp.status_code} {resp.text}")
+        return []
+
+    # The three carrier calls are independent, so fire them concurrently
+    # instead of paying 3× the round-trip latency per order.
+    with ThreadPoolExecutor(max_workers=len(carriers)) as pool:
+        for rates in pool.map(_fetch_carrier_rates, carriers):
+            all_rates.extend(rates)
 
     # If we still have no rates, tag as EDGE CASE and stop
     if not all_rates:
-        print(f"❌ No rates found for {order.get('orderNumber')} (after polling carriers); tagging as edge case")
+        log.error(f"❌ No rates found for {order.get('orderNumber')} (after polling carriers); tagging as edge case")
         assign_tag(order["orderId"], EDGE_CASE_TAG)  # uses POST /orders/addtag under the hood
         return
 
     # Preference logic – similar to your Ruby approach
     all_rates.sort(key=lambda r: r.get("shipmentCost", float("inf")))
 
-    to_country = (base_shipment.get("toCountry") or "US").upper()
-    is_domestic = to_country in {"US", "USA"}
-    try:
-        weight_oz = float((base_shipment.get("weight") or {}).get("value") or 0.0)
-    except Exception:
-        weight_oz = 0.0
-
-    expedited = _order_has_tag(order, 126500)  # expedited batch tag
-
     chosen = None
     if expedited:
-        chosen = _choose_by_keywords(all_rates, [
-            "2day", "2-day", "two day", "express", "expedited",
-            "priority_overnight", "ups_2nd_day", "ups second", "fedex_2day", "fedex 2 day",
-        ])
+        chosen = _choose_by_pattern(all_rates, EXPEDITED_RE)
 
     if not chosen and is_domestic and weight_oz > 0:
         if weight_oz < 16.0:
-            chosen = _choose_by_keywords(all_rates, ["first_class", "usps_first", "stamps_first_class", "ground_advantage", "ground advantage"])
+            chosen = _choose_by_pattern(all_rates, DOMESTIC_LIGHT_RE)
         if not chosen:
-            chosen = _choose_by_keywords(all_rates, [
-                "usps_priority", "priority_mail", "priority mail",
-                "ups_ground", "surepost",
-                "fedex_ground", "home_delivery",
-            ])
+            chosen = _choose_by_pattern(all_rates, DOMESTIC_RE)
 
     if not chosen and not is_domestic:
-        chosen = _choose_by_keywords(all_rates, [
-            "ups_worldwide", "worldwide saver", "worldwide expedited",
-            "priority_mail_international", "usps_priority_mail_international",
-            "fedex_international", "international economy", "international priority",
-        ])
+        chosen = _choose_by_pattern(all_rates, INTERNATIONAL_RE)
 
     if not chosen:
         chosen = all_rates[0]
 
     order["carrierCode"] = chosen.get("carrierCode")
     order["serviceCode"] = chosen.get("serviceCode")
-    print(
+    SELECTION_CACHE[sel_key] = (order["carrierCode"], order["serviceCode"])
+    log.info(
         f"Selected {order['carrierCode']} {order['serviceCode']} for {order.get('orderNumber')} "
         f"at ${chosen.get('shipmentCost', 0.0):.2f} (domestic={is_domestic}, weight_oz={weight_oz}, expedited={expedited})"
     )
@@ -239,7 +391,7 @@ def set_shipping_service(order: dict) -> None:
 
 # (Stub) choose billing account
 def assign_shipping_account(order: dict) -> None:
-    print(f"[stub] Would assign shipping account for order {order.get('orderNumber')}")
+    log.info(f"[stub] Would assign shipping account for order {order.get('orderNumber')}")
 
 # ---------------------------------------------------------------------------
 # Edge-case detection
@@ -269,7 +421,9 @@ def has_no_shipping_settings(order):
     )
 
 def has_new_item(order):
-    return any(sku in NEW_PRODUCT_SKUS for sku in get_skus(order))
+    # C-level set intersection beats a Python membership loop per SKU
+    skus = {(it.get('sku') or '').upper() for it in order.get('items') or ()}
+    return bool(skus & NEW_PRODUCT_SKUS)
 
 # PITB helper
 
@@ -281,94 +435,103 @@ def is_pitb(order):
 def mark_edge_case(order, reason="unknown"):
     order_num = order.get("orderNumber")
     assign_tag(order["orderId"], EDGE_CASE_TAG)
-    print(f"   ✅ Edge case tag ({EDGE_CASE_TAG}) applied to {order_num} - {reason}")
+    log.info(f"   ✅ Edge case tag ({EDGE_CASE_TAG}) applied to {order_num} - {reason}")
 
 # ---------------------------------------------------------------------------
 # Fetch stores & orders
 # ---------------------------------------------------------------------------
-print("✅ API connection successful. Here are some store names:")
-resp = requests.get(f"{BASE_URL}/stores", headers=HEADERS, auth=(API_KEY, API_SECRET))
-resp.raise_for_status()
-for store in resp.json():
-    print(f" – {store['storeName']} (ID: {store['storeId']})")
-
 STORE_IDS = [427096]  # HPS only
 EXCLUDED_TAG_IDS = {151644, 147485}  # Wayfair, Public Goods
 
+PAGE_FETCH_WORKERS = 5
+
 def fetch_all_orders(store_id: int):
-    print(f"🔀 Fetching orders for store ID {store_id} …")
-    orders, page = [], 1
-    while True:
+    log.info(f"🔀 Fetching orders for store ID {store_id} …")
+
+    def _fetch_page(page: int):
         params = {
             "storeId": store_id,
             "orderStatus": "awaiting_shipment",
-            "pageSize": 500,
+            "pageSize": 500,  # documented cap for /orders — fewest round-trips possible
+            "sortBy": "OrderDate",  # deterministic paging while pages fetch concurrently
+            "sortDir": "ASC",
             "page": page,
         }
-        r = requests.get(f"{BASE_URL}/orders", headers=HEADERS, params=params, auth=(API_KEY, API_SECRET))
+        r = api_call("GET", f"{BASE_URL}/orders", params=params)
         if r.status_code != 200:
-            print(f" ❌ Page {page} failed: {r.text}")
-            break
-        payload = r.json()
-        batch = payload.get("orders", [])
-        orders.extend(batch)
-        print(f"   • Page {page} → {len(batch)} orders")
-        if page >= payload.get("pages", 1):
-            break
-        page += 1
-        time.sleep(0.2)
+            log.error(f" ❌ Page {page} failed: {r.text}")
+            return None
+        return orjson.loads(r.content)
+
+    # Page 1 tells us the total page count; fetch the rest concurrently
+    # instead of walking them one round-trip at a time.
+    payload = _fetch_page(1)
+    if payload is None:
+        return []
+    orders = payload.get("orders", [])
+    log.info(f"   • Page 1 → {len(orders)} orders")
+    pages = payload.get("pages", 1)
+    if pages > 1:
+        with ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS) as pool:
+            for page, extra in zip(range(2, pages + 1), pool.map(_fetch_page, range(2, pages + 1))):
+                batch = (extra or {}).get("orders", [])
+                orders.extend(batch)
+                log.info(f"   • Page {page} → {len(batch)} orders")
     return orders
 
-all_orders = []
-for sid in STORE_IDS:
-    all_orders.extend(fetch_all_orders(sid))
-
-print(f"✅ Total orders fetched: {len(all_orders)}")
-
-eligible_orders = [o for o in all_orders if not set(o.get("tagIds", [])) & EXCLUDED_TAG_IDS]
-print(f"✅ Eligible for processing (after tag exclusions): {len(eligible_orders)}")
-
 # ---------------------------------------------------------------------------
 # Decide edge cases (PITB-aware)
 # ---------------------------------------------------------------------------
 
-def is_edge_case(order):
+def _order_features(o):
+    """Read each order dict once — every predicate below shares these."""
+    return SimpleNamespace(
+        tags=frozenset(o.get('tagIds') or ()),
+        adv=o.get('advancedOptions') or {},
+        # NEW_PRODUCT_SKUS is empty on current data — skip the item walk entirely
+        skus={(it.get('sku') or '').upper() for it in (o.get('items') or ())} if NEW_PRODUCT_SKUS else frozenset(),
+        weight=(o.get('weight') or {}).get('value') or 0.0,
+        dims=o.get('dimensions'),
+        carrier=o.get('carrierCode'),
+    )
+
+
+def is_edge_case(order, f=None):
     order_number = order.get('orderNumber')
+    if f is None:
+        f = _order_features(order)
 
     # --- PITB logic (mirror Ruby) ---
-    if is_pitb(order):
-        weight = (order.get('weight') or {})
-        dims = order.get('dimensions')
-        weight_val = (weight or {}).get('value')
-        missing_crit = dims is None or weight is None or weight_val in (None, 0, 0.0)
+    if PITB_TAG in f.tags:
+        missing_crit = f.dims is None or f.weight in (None, 0, 0.0)
         if missing_crit:
             mark_edge_case(order, "pitb_missing_critical_shipping_data")
             return True
-        print(f"⏩ {order_number}: PITB — skip edge-case checks (has shipping data)")
+        log.info(f"⏩ {order_number}: PITB — skip edge-case checks (has shipping data)")
         return False
     # --- end PITB logic ---
 
-    if has_edge_tag(order):
+    if EDGE_CASE_TAG in f.tags:
         mark_edge_case(order, "already_tagged")
         return True
 
-    if has_processed_tag(order):
-        print(f"⏩ {order_number}: Already processed")
+    if PROCESSED_TAG in f.tags:
+        log.info(f"⏩ {order_number}: Already processed")
         return False
 
-    if is_merged(order):
+    if f.adv.get('mergedOrSplit', False):
         mark_edge_case(order, "merged")
         return True
 
-    if has_no_location(order):
+    if f.adv.get('customField2') in [None, '', 'No Location']:
         mark_edge_case(order, "no_location")
         return True
 
-    if has_no_shipping_settings(order):
+    if f.weight == 0.0 or f.carrier is None or f.dims is None:
         mark_edge_case(order, "missing_shipping")
         return True
 
-    if has_new_item(order):
+    if NEW_PRODUCT_SKUS and f.skus & NEW_PRODUCT_SKUS:
         mark_edge_case(order, "new_sku")
         return True
 
@@ -377,64 +540,155 @@ def is_edge_case(order):
 # ---------------------------------------------------------------------------
 # Process orders
 # ---------------------------------------------------------------------------
-orders_to_process = [o for o in eligible_orders if not is_edge_case(o) and not has_processed_tag(o)]
-print(f"🚀 Beginning processing of {len(orders_to_process)} orders..")
+MAX_WORKERS = 10  # bounded so we stay under the ShipStation 200 req/min cap
 
-for order in orders_to_process:
+
+def process_order(order: dict) -> None:
     onum = order.get("orderNumber")
-    print(f"🔍 Processing order {onum}")
+    log.info(f"🔍 Processing order {onum}")
 
     assign_weight_and_dimensions(order)
     set_shipping_service(order)
     assign_shipping_account(order)
 
-    assign_tag(order["orderId"], PROCESSED_TAG)
-    print(f"✅ Order {onum} fully processed.")
+    queue_tag(order["orderId"], PROCESSED_TAG)
+    log.info(f"✅ Order {onum} fully processed.")
+
 
 # ---------------------------------------------------------------------------
 # (Optional) cache products & batch-tag by product type
 # ---------------------------------------------------------------------------
-print("🔀 Fetching product catalogue …")
-product_lookup = {}
-page = 1
-while True:
+PRODUCT_DB = BASE_DIR / ".cache" / "products.db"
+PRODUCT_CACHE_TTL = 24 * 3600  # full refetch at most once a day
+
+def _product_db() -> sqlite3.Connection:
+    PRODUCT_DB.parent.mkdir(exist_ok=True)
+    conn = sqlite3.connect(PRODUCT_DB)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS products (sku TEXT PRIMARY KEY, json TEXT, updated_at INTEGER)"
+    )
+    return conn
+
+def _fetch_product_page(page: int):
     params = {"pageSize": 500, "page": page}
-    r = requests.get(f"{BASE_URL}/products", headers=HEADERS, params=params, auth=(API_KEY, API_SECRET))
+    r = api_call("GET", f"{BASE_URL}/products", params=params)
     if r.status_code != 200:
-        print(f" ❌ Product page {page} failed: {r.status_code} – {r.text[:120]}")
-        break
-    data = r.json()
-    for p in data.get("products", []):
-        product_lookup[p["sku"]] = p
-    if page >= data.get("pages", 1):
-        break
-    page += 1
-print(f"✅ Cached {len(product_lookup)} products")
+        log.error(f" ❌ Product page {page} failed: {r.status_code} – {r.text[:120]}")
+        return None
+    return orjson.loads(r.content)
+
+def fetch_products(force_refresh: bool = False) -> dict:
+    conn = _product_db()
+    try:
+        last_updated = conn.execute("SELECT MAX(updated_at) FROM products").fetchone()[0] or 0
+        if not force_refresh and time.time() - last_updated < PRODUCT_CACHE_TTL:
+            product_lookup = {
+                sku: orjson.loads(raw)
+                for sku, raw in conn.execute("SELECT sku, json FROM products")
+            }
+            if product_lookup:
+                log.info(f"✅ Loaded {len(product_lookup)} products from cache")
+                return product_lookup
+        log.info("🔀 Fetching product catalogue …")
+        product_lookup = {}
+        complete = True
+        data = _fetch_product_page(1)
+        if data is None:
+            complete = False
+        else:
+            product_lookup.update((p["sku"], p) for p in data.get("products", []))
+            product_pages = data.get("pages", 1)
+            if product_pages > 1:
+                with ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS) as pool:
+                    for extra in pool.map(_fetch_product_page, range(2, product_pages + 1)):
+                        if extra is None:
+                            complete = False
+                            continue
+                        product_lookup.update((p["sku"], p) for p in extra.get("products", []))
+        if not complete:
+            # Don't upsert a truncated catalogue — a fresh updated_at would
+            # make the TTL serve it for the next 24h. Prefer the stale rows.
+            log.warning("⚠️ Product catalogue fetch incomplete – cache left untouched")
+            stale = {
+                sku: orjson.loads(raw)
+                for sku, raw in conn.execute("SELECT sku, json FROM products")
+            }
+            return stale or product_lookup
+        now = int(time.time())
+        conn.executemany(
+            "INSERT OR REPLACE INTO products (sku, json, updated_at) VALUES (?, ?, ?)",
+            ((sku, orjson.dumps(p).decode(), now) for sku, p in product_lookup.items()),
+        )
+        conn.commit()
+        log.info(f"✅ Cached {len(product_lookup)} products")
+        return product_lookup
+    finally:
+        conn.close()
 
 PRODUCT_TYPE_TO_BATCH_TAG = {
     "4IN-PLANT": 112293,
     "6IN-PLANT": 112295,
     "BUNDLE": 112296,
 }
+PRODUCT_TYPE_SKUS = frozenset(PRODUCT_TYPE_TO_BATCH_TAG)
 
 def get_primary_product_type(order):
-    for item in order.get("items", []):
-        sku = (item.get("sku") or "").upper()
-        if sku in PRODUCT_TYPE_TO_BATCH_TAG:
-            return sku
-    return None
-
-batch_groups = {}
-for order in eligible_orders:
-    ptype = get_primary_product_type(order)
-    if not ptype:
-        continue
-    batch_groups.setdefault(ptype, []).append(order)
-
-for ptype, orders in batch_groups.items():
-    btag = PRODUCT_TYPE_TO_BATCH_TAG[ptype]
-    for order in orders:
-        assign_tag(order["orderId"], btag)
-        print(f"Order {order['orderNumber']} tagged as batch {ptype}")
-
-print("✅ Tagging complete.")
+    return next(
+        (s for s in ((it.get("sku") or "").upper() for it in order.get("items") or ())
+         if s in PRODUCT_TYPE_SKUS),
+        None,
+    )
+
+# ---------------------------------------------------------------------------
+# Orchestration
+# ---------------------------------------------------------------------------
+def main():
+    log.info("✅ API connection successful. Here are some store names:")
+    resp = api_call("GET", f"{BASE_URL}/stores")
+    resp.raise_for_status()
+    for store in orjson.loads(resp.content):
+        log.info(f" – {store['storeName']} (ID: {store['storeId']})")
+
+    all_orders = []
+    for sid in STORE_IDS:
+        all_orders.extend(fetch_all_orders(sid))
+    log.info(f"✅ Total orders fetched: {len(all_orders)}")
+
+    # isdisjoint short-circuits on the first excluded tag without allocating a set per order
+    eligible_orders = [o for o in all_orders if EXCLUDED_TAG_IDS.isdisjoint(o.get("tagIds") or ())]
+    log.info(f"✅ Eligible for processing (after tag exclusions): {len(eligible_orders)}")
+
+    # Single pass over eligible_orders: edge-case triage and batch grouping
+    # share one _order_features read per order instead of two traversals.
+    orders_to_process = []
+    batch_groups = {}
+    for o in eligible_orders:
+        f = _order_features(o)
+        if not is_edge_case(o, f) and PROCESSED_TAG not in f.tags:
+            orders_to_process.append(o)
+        ptype = get_primary_product_type(o)
+        if ptype:
+            batch_groups.setdefault(ptype, []).append(o)
+    log.info(f"🚀 Beginning processing of {len(orders_to_process)} orders..")
+
+    # The per-order work is entirely I/O bound (rate calls + tagging), so run
+    # orders through a bounded worker pool instead of strictly serially.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        list(pool.map(process_order, orders_to_process))
+
+    flush_tag_queue()
+
+    fetch_products()
+
+    for ptype, orders in batch_groups.items():
+        btag = PRODUCT_TYPE_TO_BATCH_TAG[ptype]
+        for order in orders:
+            queue_tag(order["orderId"], btag)
+            log.info(f"Order {order['orderNumber']} tagged as batch {ptype}")
+
+    flush_tag_queue()
+    log.info("✅ Tagging complete.")
+
+
+if __name__ == "__main__":
+    main()
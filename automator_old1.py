@@ -1,12 +1,18 @@
+import logging
+import logging.handlers
 import os
 import json
-import requests
-import time
+import pickle
+import re
+
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from pathlib import Path
-from collections import defaultdict
+from collections import Counter, defaultdict
+from enum import IntEnum
 import hashlib
-from shipstation_client import assign_tag
+from shipstation_http import BASE_URL, SESSION
 
 """
 ShipStation Order Processor (Python rewrite)
@@ -39,9 +45,43 @@ API_SECRET = os.getenv("SHIPSTATION_V1_SECRET")
 if not API_KEY or not API_SECRET:
     raise RuntimeError("API credentials not loaded – check your .env file")
 
-BASE_URL = "https://ssapi.shipstation.com"
 HEADERS  = {"Content-Type": "application/json"}
 
+# Buffered, leveled logging instead of per-call print — the MemoryHandler
+# batches INFO chatter and flushes in kilobyte chunks (or on any WARNING)
+_stream = logging.StreamHandler()
+_stream.setFormatter(logging.Formatter("%(message)s"))
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    handlers=[logging.handlers.MemoryHandler(1024, flushLevel=logging.WARNING, target=_stream)],
+)
+log = logging.getLogger(__name__)
+
+PAGE_FETCH_WORKERS = 8
+TAG_OP_WORKERS = 16
+
+def _post_tag_op(op):
+    order_id, tag_id, action = op
+    endpoint = "addtag" if action == "assign" else "removetag"
+    payload = {"orderId": int(order_id), "tagId": int(tag_id)}
+    return op, SESSION.post(f"{BASE_URL}/orders/{endpoint}", data=orjson.dumps(payload))
+
+def flush_tag_ops(ops):
+    """Dispatch queued (order_id, tag_id, "assign"|"remove") tag mutations
+    concurrently, de-duplicated, returning (op, response) pairs."""
+    with ThreadPoolExecutor(max_workers=TAG_OP_WORKERS) as pool:
+        return list(pool.map(_post_tag_op, set(ops)))
+
+def assign_tag(order_id, tag_id):
+    """Apply one tag immediately via POST /orders/addtag.
+
+    Edge cases bypass the ops queue on purpose: their tag has to land
+    before later passes consult the order again."""
+    _op, resp = _post_tag_op((order_id, tag_id, "assign"))
+    if resp.status_code != 200:
+        log.error(f"❌ Failed to tag order {order_id}: {resp.status_code} - {resp.text}")
+    return resp
+
 # ---------------------------------------------------------------------------
 # 🍿  Helpful tag → name mapping
 # ---------------------------------------------------------------------------
@@ -76,14 +116,56 @@ def tag_name(tag_id: int) -> str:
     return TAG_NAMES.get(tag_id, str(tag_id))
 
 # ---------------------------------------------------------------------------
-# 🔍  Phase 1 – list stores
+# 🏷  Phase 4 substring rules, precompiled into Aho–Corasick automatons
 # ---------------------------------------------------------------------------
 
-print("✅ API connection successful. Here are some store names:")
-resp = requests.get(f"{BASE_URL}/stores", headers=HEADERS, auth=(API_KEY, API_SECRET))
-resp.raise_for_status()
-for store in resp.json():
-    print(f" – {store['storeName']} (ID: {store['storeId']})")
+SKU_NEEDLE_TO_TAG = {
+    "bundle": 112296,
+    "6in": 112295,
+    "8in": 126425,
+    "10in": 126425,
+    "cut": 126427,
+}
+# "4in" is count-sensitive (1 vs 2+) and stays a separate check in Phase 4
+
+NAME_NEEDLE_TO_TAG = {
+    "air plant": 100783,
+    "potted plant": 100784,
+    "accessor": 112302,
+    "cutting": 124699,
+    "planter": 118141,
+    "variety": 100785,
+    "pre pot": 119141,
+    "bundle": 111473,
+}
+
+try:
+    import ahocorasick
+except ImportError:  # optional — Phase 4 falls back to chained substring scans
+    ahocorasick = None
+
+try:
+    import ijson
+except ImportError:  # optional — Phase 3 falls back to whole-page orjson decode
+    ijson = None
+
+def _build_automaton(needle_to_tag):
+    automaton = ahocorasick.Automaton()
+    for needle, tag_id in needle_to_tag.items():
+        automaton.add_word(needle, tag_id)
+    automaton.make_automaton()
+    return automaton
+
+SKU_AUTOMATON = _build_automaton(SKU_NEEDLE_TO_TAG) if ahocorasick else None
+NAME_AUTOMATON = _build_automaton(NAME_NEEDLE_TO_TAG) if ahocorasick else None
+
+# Fallback when pyahocorasick is absent: one C-level alternation scan per
+# string still beats a chained Python `in` check per needle. The lookahead
+# wrapper makes findall report overlapping needles ("air planter" hits both
+# "air plant" and "planter"), matching the automaton's semantics
+SKU_RE = re.compile("(?=(" + "|".join(map(re.escape, SKU_NEEDLE_TO_TAG)) + "))")
+NAME_RE = re.compile("(?=(" + "|".join(map(re.escape, NAME_NEEDLE_TO_TAG)) + "))")
+
 
 # ---------------------------------------------------------------------------
 # 📦  Phase 2 – fetch all orders
@@ -93,95 +175,45 @@ STORE_IDS = [427096]  # HPS only
 EXCLUDED_TAG_IDS = {151644, 147485}
 
 def fetch_all_orders(store_id: int):
-    print(f"\n🔀 Fetching orders for store ID {store_id} …")
-    orders, page = [], 1
-    while True:
+    log.info(f"🔀 Fetching orders for store ID {store_id} …")
+
+    def _fetch_page(page: int):
         params = {
             "storeId": store_id,
             "orderStatus": "awaiting_shipment",
             "pageSize": 500,
             "page": page,
         }
-        r = requests.get(f"{BASE_URL}/orders", headers=HEADERS, params=params, auth=(API_KEY, API_SECRET))
+        r = SESSION.get(f"{BASE_URL}/orders", params=params)
         if r.status_code != 200:
-            print(f" ❌ Page {page} failed: {r.text}")
-            break
-        payload = r.json()
-        batch = payload.get("orders", [])
-        orders.extend(batch)
-        print(f"   • Page {page} → {len(batch)} orders")
-        if page >= payload.get("pages", 1):
-            break
-        page += 1
-        time.sleep(0.2)
+            log.error(f" ❌ Page {page} failed: {r.text}")
+            return None
+        return orjson.loads(r.content)
+
+    # Page 1 reports the total page count; pages 2..N fetch in parallel
+    payload = _fetch_page(1)
+    if payload is None:
+        return []
+    orders = payload.get("orders", [])
+    log.info(f"   • Page 1 → {len(orders)} orders")
+    pages = payload.get("pages", 1)
+    if pages > 1:
+        with ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS) as pool:
+            for page, extra in zip(range(2, pages + 1), pool.map(_fetch_page, range(2, pages + 1))):
+                batch = (extra or {}).get("orders", [])
+                orders.extend(batch)
+                log.info(f"   • Page {page} → {len(batch)} orders")
     return orders
 
-all_orders = []
-for sid in STORE_IDS:
-    all_orders.extend(fetch_all_orders(sid))
-
-print(f"\n✅ Total orders fetched: {len(all_orders)}")
-
-eligible_orders = [o for o in all_orders if not set(o.get("tagIds", [])) & EXCLUDED_TAG_IDS]
-print(f"✅ Eligible for processing (after tag exclusions): {len(eligible_orders)}")
-
-def is_edge_case(order):
-    order_number = order.get('orderNumber')
-
-    if has_edge_tag(order):
-        print(f"⚠️  {order_number}: Already marked as edge case")
-        return True
-
-    if has_processed_tag(order):
-        print(f"⏩ {order_number}: Already processed")
-        return False
-
-    if is_merged(order):
-        print(f"🚫 {order_number}: Merged order – edge case")
-        assign_tag(order['orderId'], EDGE_CASE_TAG)
-        return True
-
-    if has_no_location(order):
-        print(f"🚫 {order_number}: No location assigned – edge case")
-        assign_tag(order['orderId'], EDGE_CASE_TAG)
-        return True
-
-    if has_no_shipping_settings(order):
-        print(f"🚫 {order_number}: Missing shipping settings – edge case")
-        assign_tag(order['orderId'], EDGE_CASE_TAG)
-        return True
-
-    if has_new_item(order):
-        print(f"🚫 {order_number}: Contains new SKU – edge case")
-        assign_tag(order['orderId'], EDGE_CASE_TAG)
-        return True
-
-    return False
-
-
-orders_to_process = [
-    order for order in eligible_orders
-    if not is_edge_case(order) and not has_processed_tag(order)
-]
-
-print(f"🚀 Beginning processing of {len(orders_to_process)} orders...\n")
-
-for order in orders_to_process:
-    order_number = order.get("orderNumber")
-    print(f"🔍 Processing order {order_number}")
-
-    # 🚚 Determine cheapest shipping
-    set_shipping_service(order)
-
-    # 💳 Set appropriate billing account
-    assign_shipping_account(order)
-
-    # 🏷 Tag as processed
-    assign_tag(order["orderId"], PROCESSED_TAG)
+def normalize_order(order):
+    """Precompute the hot per-order fields once so the edge-case and tagging
+    predicates don't repeat nested .get chains on every call."""
+    order["_weight"] = float((order.get("weight") or {}).get("value") or 0.0)
+    order["_carrier"] = (order.get("carrierCode") or "").lower()
+    order["_tags"] = frozenset(order.get("tagIds") or ())
+    order["_advanced"] = order.get("advancedOptions") or {}
 
-    print(f"✅ Order {order_number} fully processed.\n")
 
-        
 # ---------------------------------------------------------------------------
 # 🚚  Shipping logic and account selection
 # ---------------------------------------------------------------------------
@@ -220,8 +252,7 @@ def set_shipping_service(order):
     - FedEx Home Delivery for residential
     - FedEx Ground for commercial
     """
-    weight = order.get("weight", {}).get("value", 0.0)
-    if weight < 16:
+    if order["_weight"] < 16:
         order.update({
             "carrierCode": "stamps_com",
             "serviceCode": "usps_first_class_mail",
@@ -234,6 +265,9 @@ def set_shipping_service(order):
             "serviceCode": "fedex_home_delivery" if is_residential else "fedex_ground",
             "packageCode": "package"
         })
+    # Keep the cached field in sync — the fused pass reads _carrier for the
+    # expedited-tag check right after this runs
+    order["_carrier"] = order["carrierCode"]
     assign_shipping_account(order)
 
 
@@ -241,78 +275,96 @@ def set_shipping_service(order):
 # 📦  Phase 3 – cache all products
 # ---------------------------------------------------------------------------
 
-print("\n🔀 Fetching product catalogue …")
-product_lookup = {}
-page = 1
-while True:
-    params = {"pageSize": 500, "page": page}
-    r = requests.get(f"{BASE_URL}/products", headers=HEADERS, params=params, auth=(API_KEY, API_SECRET))
-    if r.status_code != 200:
-        print(f" ❌ Product page {page} failed: {r.status_code} – {r.text[:120]}")
-        break
-    data = r.json()
-    for p in data.get("products", []):
-        product_lookup[p["sku"]] = p
-    if page >= data.get("pages", 1):
-        break
-    page += 1
-print(f"✅ Cached {len(product_lookup)} products\n")
-
-# ---------------------------------------------------------------------------
-# 🧐  Phase 4 – tagging logic
-# ---------------------------------------------------------------------------
+PRODUCT_CACHE_PATH = Path(__file__).resolve().parent / ".product_cache.pkl"
 
-for order in eligible_orders:
-    skus = [item.get("sku") for item in order.get("items", []) if item.get("sku")]
-    lower_skus = [sku.lower() for sku in skus if sku]
-    tags_to_apply = set()
-
-    carrier_code = order.get("carrierCode")
-    if carrier_code and carrier_code.lower() in {"fedex", "ups"}:
-        tags_to_apply.add(126500)
-
-    for sku in lower_skus:
-        if "bundle" in sku:
-            tags_to_apply.add(112296)
-        if "4in" in sku:
-            if lower_skus.count(sku) == 1:
-                tags_to_apply.add(112293)
-            elif lower_skus.count(sku) >= 2:
-                tags_to_apply.add(112294)
-        if "6in" in sku:
-            tags_to_apply.add(112295)
-        if "8in" in sku or "10in" in sku:
-            tags_to_apply.add(126425)
-        if "cut" in sku:
-            tags_to_apply.add(126427)
-
-        product = product_lookup.get(sku)
-        if product:
-            pname = (product.get("name") or "").lower()
-            if "air plant" in pname:
-                tags_to_apply.add(100783)
-            if "potted plant" in pname:
-                tags_to_apply.add(100784)
-            if "accessor" in pname:
-                tags_to_apply.add(112302)
-            if "cutting" in pname:
-                tags_to_apply.add(124699)
-            if "planter" in pname:
-                tags_to_apply.add(118141)
-            if "variety" in pname:
-                tags_to_apply.add(100785)
-            if "pre pot" in pname:
-                tags_to_apply.add(119141)
-            if "bundle" in pname:
-                tags_to_apply.add(111473)
-
-    existing = set(order.get("tagIds", []))
-    for tag_id in tags_to_apply:
-        if tag_id not in existing:
-            print(f"🏷 Tagging {order['orderNumber']} as {tag_name(tag_id)}")
-            assign_tag(order["orderId"], tag_id)
-
-print("\n✅ Tagging complete.")
+def _latest_modify_date():
+    """Cheap probe: the modifyDate of the most recently touched product."""
+    r = SESSION.get(f"{BASE_URL}/products",
+                    params={"pageSize": 1, "sortBy": "ModifyDate", "sortDir": "DESC"})
+    if r.status_code != 200:
+        return None
+    products = orjson.loads(r.content).get("products") or []
+    return products[0].get("modifyDate") if products else None
+
+def fetch_products():
+    # Warm path: reuse the pickled catalogue when nothing changed upstream
+    latest = _latest_modify_date()
+    if latest and PRODUCT_CACHE_PATH.exists():
+        try:
+            with open(PRODUCT_CACHE_PATH, "rb") as fh:
+                cached = pickle.load(fh)
+            if cached.get("latest_modify_date") == latest:
+                log.info("✅ Product cache is fresh – skipping catalogue download")
+                return cached["lookup"]
+        except Exception:
+            pass  # corrupt or stale cache → fall through to a full fetch
+
+    def _fetch_product_page(page):
+        params = {"pageSize": 500, "page": page}
+        if ijson is not None:
+            # Stream-parse so only one product is live at a time instead of
+            # the whole multi-MB page; project out just the name we use
+            r = SESSION.get(f"{BASE_URL}/products", params=params, stream=True)
+            if r.status_code != 200:
+                log.error(f" ❌ Product page {page} failed: {r.status_code} – {r.text[:120]}")
+                return None, 1
+            # r.raw hands back transport bytes — tell urllib3 to gunzip
+            # them, or a Content-Encoding: gzip response breaks the parser
+            r.raw.decode_content = True
+            local = {}
+            pages = 1
+            sku = name = None
+            for prefix, event, value in ijson.parse(r.raw):
+                if prefix == "products.item.sku":
+                    sku = value
+                elif prefix == "products.item.name":
+                    name = value
+                elif prefix == "products.item" and event == "end_map":
+                    if sku:
+                        local[sku.lower().strip()] = {"name": name}
+                    sku = name = None
+                elif prefix == "pages":
+                    pages = value
+            return local, pages
+
+        r = SESSION.get(f"{BASE_URL}/products", params=params)
+        if r.status_code != 200:
+            log.error(f" ❌ Product page {page} failed: {r.status_code} – {r.text[:120]}")
+            return None, 1
+        data = orjson.loads(r.content)
+        # Keys are lower-cased so Phase 4 lookups match the lowered SKUs;
+        # only the name is kept, which shrinks the lookup (and its pickle)
+        local = {
+            p["sku"].lower().strip(): {"name": p.get("name")}
+            for p in data.get("products", []) if p.get("sku")
+        }
+        return local, data.get("pages", 1)
+
+    # Page 1 tells us how many pages exist; fetch the rest in parallel and
+    # merge each worker's local dict on the main thread (no lock needed)
+    lookup, pages = _fetch_product_page(1)
+    if lookup is None:
+        return {}
+    complete = True
+    if pages > 1:
+        with ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS) as pool:
+            for local, _ in pool.map(_fetch_product_page, range(2, pages + 1)):
+                if local is None:
+                    complete = False
+                    continue
+                lookup.update(local)
+
+    if not complete:
+        # A pickled partial catalogue would look fresh until some product
+        # is modified upstream — better to refetch next run
+        log.warning("⚠️ Product catalogue incomplete – not caching this run")
+    elif latest:
+        # Write-then-rename so a concurrent run never reads a torn file
+        tmp = PRODUCT_CACHE_PATH.with_suffix(".pkl.tmp")
+        with open(tmp, "wb") as fh:
+            pickle.dump({"latest_modify_date": latest, "lookup": lookup}, fh)
+        os.replace(tmp, PRODUCT_CACHE_PATH)
+    return lookup
 
 
 # ---------------------------------------------------------------------------
@@ -321,7 +373,7 @@ print("\n✅ Tagging complete.")
 
 EDGE_CASE_TAG = 145681
 PROCESSED_TAG = 145844
-NEW_PRODUCT_SKUS = set()
+NEW_PRODUCT_SKUS = frozenset()
 
 EDGE_CASE_REASONS = {
     "merged": "Merged order",
@@ -329,83 +381,169 @@ EDGE_CASE_REASONS = {
     "missing_shipping": "Missing shipping settings",
     "new_sku": "Contains new SKU",
     "already_tagged": "Already marked edge case",
-    "already_processed": "Already processed"
+    "already_processed": "Already processed",
+    "error": "Edge case check failed"
 }
 
-def get_skus(order):
-    return [item['sku'] for item in order.get('items', []) if item['sku'] != 'total-discount']
-
-def is_light(order):
-    return order.get('weight', {}).get('value', 0.0) < 16
-
-def has_edge_tag(order):
-    return EDGE_CASE_TAG in order.get('tagIds', [])
-
-def has_processed_tag(order):
-    return PROCESSED_TAG in order.get('tagIds', [])
-
-def is_merged(order):
-    return order.get('advancedOptions', {}).get('mergedOrSplit', False)
-
-def has_no_location(order):
-    return order.get('advancedOptions', {}).get('customField2') in [None, '', 'No Location']
-
-def has_no_shipping_settings(order):
+def iter_skus(order):
+    """Yield the order's SKUs lazily, skipping discount pseudo-items."""
     return (
-        order.get('weight', {}).get('value', 0.0) == 0.0 or
-        order.get('carrierCode') is None or
-        order.get('dimensions') is None
+        item['sku']
+        for item in order.get('items', ())
+        if item.get('sku') and item['sku'] != 'total-discount'
     )
 
-def has_new_item(order):
-    return any(sku in NEW_PRODUCT_SKUS for sku in get_skus(order))
+def get_skus(order):
+    return list(iter_skus(order))
+
+class EdgeReason(IntEnum):
+    OK = 0
+    ALREADY_TAGGED = 1
+    ALREADY_PROCESSED = 2
+    MERGED = 3
+    NO_LOCATION = 4
+    MISSING_SHIPPING = 5
+    NEW_SKU = 6
+    ERROR = 7
+
+def classify(order):
+    """Single-pass edge-case evaluation over the cached _-fields.
+
+    Returns the first matching EdgeReason; OK means the order is safe to
+    process. Replaces the old chain of predicate helpers (and the shadowed
+    duplicate is_edge_case) with one traversal."""
+    try:
+        tags = order['_tags']
+        if EDGE_CASE_TAG in tags:
+            return EdgeReason.ALREADY_TAGGED
+        if PROCESSED_TAG in tags:
+            return EdgeReason.ALREADY_PROCESSED
+        advanced = order['_advanced']
+        if advanced.get('mergedOrSplit', False):
+            return EdgeReason.MERGED
+        if advanced.get('customField2') in (None, '', 'No Location'):
+            return EdgeReason.NO_LOCATION
+        if order['_weight'] == 0.0 or not order['_carrier'] or order.get('dimensions') is None:
+            return EdgeReason.MISSING_SHIPPING
+        # Generator + frozenset lookup: short-circuits on the first new SKU
+        if NEW_PRODUCT_SKUS and any(sku in NEW_PRODUCT_SKUS for sku in iter_skus(order)):
+            return EdgeReason.NEW_SKU
+        return EdgeReason.OK
+    except Exception as e:
+        log.error(f"Edge case check failed for {order.get('orderNumber')}: {e}")
+        return EdgeReason.ERROR
 
 def mark_edge_case(order, reason="unknown"):
     order_number = order.get("orderNumber")
-    print(f"Evaluating order {order_number} → Edge case reason: {reason}")
-    if EDGE_CASE_TAG not in order['tagIds']:
+    log.info(f"Evaluating order {order_number} → Edge case reason: {reason}")
+    if EDGE_CASE_TAG not in order['_tags']:
         assign_tag(order['orderId'], EDGE_CASE_TAG)
-        print(f"   ✅ Edge case tag applied to {order_number}")
+        order['_tags'] |= {EDGE_CASE_TAG}
+        log.info(f"   ✅ Edge case tag applied to {order_number}")
     else:
-        print(f"   ⚠️ Edge case tag already exists on {order_number}")
+        log.warning(f"   ⚠️ Edge case tag already exists on {order_number}")
 
 
-def is_edge_case(order):
-    try:
-        order_number = order.get('orderNumber')
-
-        if has_edge_tag(order):
-            mark_edge_case(order, "already_tagged")
-            return True
-
-        if has_processed_tag(order):
-            print(f"{order_number}: {EDGE_CASE_REASONS['already_processed']}")
-            return False
-
-        if is_merged(order):
-            mark_edge_case(order, "merged")
-            return True
-
-        if has_no_location(order):
-            mark_edge_case(order, "no_location")
-            return True
-
-        if has_no_shipping_settings(order):
-            mark_edge_case(order, "missing_shipping")
-            return True
+# ---------------------------------------------------------------------------
+# 🧐  Phase 4 – single fused pass: edge cases, shipping, batch tagging
+# ---------------------------------------------------------------------------
 
-        if has_new_item(order):
-            mark_edge_case(order, "new_sku")
-            return True
+def process_order(order, ops_queue, order_numbers, product_lookup):
+    """One traversal per order: edge-case check, shipping setup and batch/
+    product-type tag computation, emitting mutations into ops_queue."""
+    order_number = order.get("orderNumber")
+    order_numbers[order["orderId"]] = order_number
+
+    reason = classify(order)
+    if reason is EdgeReason.OK:
+        log.info(f"🔍 Processing order {order_number}")
+        # 🚚 Cheapest shipping + billing account, then queue the processed tag
+        set_shipping_service(order)
+        ops_queue.append((order["orderId"], PROCESSED_TAG, "assign"))
+    elif reason is EdgeReason.ALREADY_PROCESSED:
+        log.info(f"⏩ {order_number}: {EDGE_CASE_REASONS['already_processed']}")
+    else:
+        mark_edge_case(order, reason.name.lower())
 
-        return False
+    counts = Counter(  # O(1) quantity lookups instead of list.count per SKU
+        item["sku"].lower().strip()
+        for item in order.get("items", [])
+        if item.get("sku")
+    )
+    tags_to_apply = set()
 
-    except Exception as e:
-        print(f"Edge case check failed for {order.get('orderNumber')}: {e}")
-        return True
+    if order["_carrier"] in {"fedex", "ups"}:
+        tags_to_apply.add(126500)
 
-print("\n✅ Edge case module ready.")
+    # Iterating the Counter also skips re-running tag logic on repeat SKUs
+    for sku in counts:
+        if SKU_AUTOMATON is not None:
+            # One linear pass emits every matching needle's tag
+            for _, tag_id in SKU_AUTOMATON.iter(sku):
+                tags_to_apply.add(tag_id)
+        else:
+            for needle in SKU_RE.findall(sku):
+                tags_to_apply.add(SKU_NEEDLE_TO_TAG[needle])
+        if "4in" in sku:
+            if counts[sku] == 1:
+                tags_to_apply.add(112293)
+            elif counts[sku] >= 2:
+                tags_to_apply.add(112294)
 
-print("\n🔍 Evaluating orders for edge cases...")
-for order in eligible_orders:
-    is_edge_case(order)
\ No newline at end of file
+        product = product_lookup.get(sku)
+        if product:
+            pname = (product.get("name") or "").lower()
+            if NAME_AUTOMATON is not None:
+                for _, tag_id in NAME_AUTOMATON.iter(pname):
+                    tags_to_apply.add(tag_id)
+            else:
+                for needle in NAME_RE.findall(pname):
+                    tags_to_apply.add(NAME_NEEDLE_TO_TAG[needle])
+
+    existing = order["_tags"]
+    for tag_id in tags_to_apply:
+        if tag_id not in existing:
+            log.info(f"🏷 Tagging {order_number} as {tag_name(tag_id)}")
+            ops_queue.append((order["orderId"], tag_id, "assign"))
+
+def main():
+    # Phase 1 – list stores
+    log.info("✅ API connection successful. Here are some store names:")
+    resp = SESSION.get(f"{BASE_URL}/stores")
+    resp.raise_for_status()
+    for store in orjson.loads(resp.content):
+        log.info(f" – {store['storeName']} (ID: {store['storeId']})")
+
+    # Phase 2 – fetch all orders
+    all_orders = []
+    for sid in STORE_IDS:
+        all_orders.extend(fetch_all_orders(sid))
+
+    for o in all_orders:
+        normalize_order(o)
+
+    log.info(f"✅ Total orders fetched: {len(all_orders)}")
+    eligible_orders = [o for o in all_orders if o["_tags"].isdisjoint(EXCLUDED_TAG_IDS)]
+    log.info(f"✅ Eligible for processing (after tag exclusions): {len(eligible_orders)}")
+
+    # Phase 3 – cache all products
+    log.info("🔀 Fetching product catalogue …")
+    product_lookup = fetch_products()
+    log.info(f"✅ Cached {len(product_lookup)} products")
+
+    # Phase 4 – fused edge-case / shipping / tagging pass
+    tag_ops = []
+    order_numbers = {}
+    log.info(f"🚀 Beginning processing of {len(eligible_orders)} orders...")
+    for order in eligible_orders:
+        process_order(order, tag_ops, order_numbers, product_lookup)
+
+    # One concurrent flush instead of a round-trip per (order, tag) pair
+    for (order_id, tag_id, _action), resp in flush_tag_ops(tag_ops):
+        if resp.status_code != 200:
+            log.error(f"❌ Failed to tag order {order_numbers.get(order_id, order_id)} with {tag_name(tag_id)}: {resp.status_code} - {resp.text}")
+
+    log.info("✅ Tagging complete.")
+
+if __name__ == "__main__":
+    main()
